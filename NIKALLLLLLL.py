@@ -1,9 +1,34 @@
+import io
 import os
 import re
+import mmap
+import time
+import atexit
+import shutil
+import sqlite3
+import threading
+import quopri
+import asyncio
+import tempfile
+import zipfile
+import multiprocessing
+import numpy as np
 import pandas as pd
+import openpyxl
+import metrics
 from datetime import datetime
 import traceback
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields, astuple, replace
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import chain, islice
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram.error import TelegramError, RetryAfter, TimedOut, NetworkError, BadRequest
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -28,15 +53,200 @@ BOT_START_TIME = datetime.utcnow()
 default_vcf_name = "Contacts"
 default_contact_name = "Contact"
 default_limit = 100
+default_zip_mode = "auto"
+MIN_NUMBER_LEN = int(os.environ.get("MIN_NUMBER_LEN", "7"))
+MAX_NUMBER_LEN = int(os.environ.get("MAX_NUMBER_LEN", "15"))            # E.164 maximum
+NATIONAL_NUMBER_LEN = int(os.environ.get("NATIONAL_NUMBER_LEN", "10"))  # digits left after a detected country code
+NORMALIZE_BATCH = int(os.environ.get("NORMALIZE_BATCH", "100000"))
+TABLE_SAMPLE_ROWS = int(os.environ.get("TABLE_SAMPLE_ROWS", "200"))   # rows sampled to find the number column
+TABLE_CHUNK_ROWS = int(os.environ.get("TABLE_CHUNK_ROWS", "50000"))
+SUPPORTED_EXTENSIONS = (".txt", ".csv", ".xlsx", ".vcf")
+NUMBER_HEADERS = ("numbers", "number", "phone", "phones", "mobile", "tel", "msisdn")
+TXT_SCAN_BLOCK = int(os.environ.get("TXT_SCAN_BLOCK", str(8 * 1024 * 1024)))  # bytes scanned per regex pass
+ZIP_AUTO_CHUNKS = int(os.environ.get("ZIP_AUTO_CHUNKS", "20"))  # "auto" bundles splits with more files than this
+ZIP_PART_MAX_BYTES = int(os.environ.get("ZIP_PART_MAX_BYTES", str(40 * 1024 * 1024)))  # archive parts roll over here (upload limit: 50 MB)
+
+# ✅ DOWNLOADS (uploads are parsed from memory; only big ones touch a per-user scratch dir)
+DOWNLOAD_MAX_BYTES = int(os.environ.get("DOWNLOAD_MAX_BYTES", str(20 * 1024 * 1024)))    # Bot API getFile limit
+DOWNLOAD_MEMORY_MAX = int(os.environ.get("DOWNLOAD_MEMORY_MAX", str(8 * 1024 * 1024)))   # larger files go to scratch
+MERGE_MEMORY_NUMBERS = int(os.environ.get("MERGE_MEMORY_NUMBERS", "10000000"))  # ~80 MB of keys in RAM before spilling to SQLite
+MERGE_MAX_FILES = int(os.environ.get("MERGE_MAX_FILES", "50"))           # files one /merge session may collect
+MERGE_SESSION_TTL = int(os.environ.get("MERGE_SESSION_TTL", str(6 * 3600)))  # idle seconds before a /merge is dropped
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "vcfbot-scratch"))
+
+# ✅ UPLOAD LIMITS (Telegram: ~30 msg/s per bot, ~1 msg/s sustained per chat)
+UPLOAD_WINDOW = int(os.environ.get("UPLOAD_WINDOW", "4"))            # files rendered ahead of the one being sent
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "8"))  # uploads in flight across all chats
+UPLOAD_CHAT_RATE = float(os.environ.get("UPLOAD_CHAT_RATE", "1"))
+UPLOAD_CHAT_BURST = int(os.environ.get("UPLOAD_CHAT_BURST", "20"))
+UPLOAD_GLOBAL_RATE = float(os.environ.get("UPLOAD_GLOBAL_RATE", "30"))
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", "5"))
+
+# ✅ CONVERSION EXECUTOR (parsing/rendering of uploads runs here, off the event loop)
+CONVERT_EXECUTOR = os.environ.get("CONVERT_EXECUTOR", "process")  # process | thread
+CONVERT_WORKERS = int(os.environ.get("CONVERT_WORKERS", str(os.cpu_count() or 2)))
+CONVERT_MAX_QUEUE = int(os.environ.get("CONVERT_MAX_QUEUE", "32"))  # jobs running + waiting, across all users
+CONVERT_PER_USER = int(os.environ.get("CONVERT_PER_USER", "1"))     # workers a single user may occupy
+
+# ✅ JOBS (uploads, merges and text batches run as background jobs, one at a time per user)
+JOB_HEAVY_LIMIT = int(os.environ.get("JOB_HEAVY_LIMIT", "4"))        # CPU stages (parse, render) running at once, across all users
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "5"))            # jobs a user may have waiting
+PROGRESS_INTERVAL = float(os.environ.get("PROGRESS_INTERVAL", "3"))  # seconds between progress message edits
+
+# ✅ RESULT CACHE (repeat uploads are answered with the file_ids we already sent)
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "2048"))             # entries kept, least recently used dropped first
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", str(7 * 24 * 3600)))  # seconds an entry stays valid
+
+# ✅ METRICS (children resolved once here; hot paths only update them)
+STAGE_SECONDS = metrics.Histogram("vcfbot_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+DOWNLOAD_SECONDS = STAGE_SECONDS.labels("download")
+PARSE_SECONDS = STAGE_SECONDS.labels("parse")        # includes the wait for an executor slot
+NORMALIZE_SECONDS = STAGE_SECONDS.labels("normalize")  # only what runs in this process
+RENDER_SECONDS = STAGE_SECONDS.labels("render")
+UPLOAD_SECONDS = STAGE_SECONDS.labels("upload")      # pacing and retries included
+BYTES_IN = metrics.Counter("vcfbot_bytes_in_total", "Bytes of user files downloaded.").labels()
+BYTES_OUT = metrics.Counter("vcfbot_bytes_out_total", "Bytes of documents uploaded.").labels()
+TELEGRAM_SECONDS = metrics.Histogram("vcfbot_telegram_api_seconds", "Telegram Bot API call latency.", ("method",))
+TELEGRAM_ERRORS = metrics.Counter("vcfbot_telegram_api_errors_total", "Failed Telegram Bot API calls.", ("method", "error"))
 
 # ✅ USER SETTINGS
-user_file_names = {}
-user_contact_names = {}
-user_limits = {}
-user_start_indexes = {}
-user_vcf_start_numbers = {}
-user_country_codes = {}
-user_group_start_numbers = {}
+SETTINGS_DB = os.environ.get("SETTINGS_DB", "user_settings.db")
+SETTINGS_CACHE_SIZE = int(os.environ.get("SETTINGS_CACHE_SIZE", "1024"))
+SETTINGS_FLUSH_INTERVAL = float(os.environ.get("SETTINGS_FLUSH_INTERVAL", "2"))  # seconds between batched writes
+
+@dataclass(slots=True)
+class UserSettings:
+    file_name: str = default_vcf_name
+    contact_name: str = default_contact_name
+    limit: int = default_limit
+    start_index: Optional[int] = None
+    vcf_start: Optional[int] = None
+    country_code: str = ""
+    group_start: Optional[int] = None
+    zip_mode: str = default_zip_mode
+
+class SettingsStore:
+    # LRU cache in front of SQLite. Writes land in the cache immediately and are queued;
+    # a background thread flushes the queue in one transaction every flush_interval seconds.
+    COLUMNS = tuple(f.name for f in fields(UserSettings))
+
+    def __init__(self, path=SETTINGS_DB, cache_size=SETTINGS_CACHE_SIZE, flush_interval=SETTINGS_FLUSH_INTERVAL):
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.cache = OrderedDict()
+        self.dirty = {}  # user_id -> UserSettings to upsert, or None to delete
+        self.lock = threading.RLock()
+        self.conn = None
+        self.flusher = None
+
+    def _db(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            cols = ", ".join(f'"{c}"' for c in self.COLUMNS)
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS user_settings (user_id INTEGER PRIMARY KEY, {cols})")
+            self.conn.commit()
+        return self.conn
+
+    def _start_flusher(self):
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self._flush_loop, name="settings-flush", daemon=True)
+            self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def get(self, user_id):
+        with self.lock:
+            settings = self.cache.get(user_id)
+            if settings is not None:
+                self.cache.move_to_end(user_id)
+                return settings
+            if user_id in self.dirty:
+                settings = self.dirty[user_id] or UserSettings()
+            else:
+                cols = ", ".join(f'"{c}"' for c in self.COLUMNS)
+                row = self._db().execute(f"SELECT {cols} FROM user_settings WHERE user_id = ?", (user_id,)).fetchone()
+                settings = UserSettings(*row) if row else UserSettings()
+            self.cache[user_id] = settings
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)  # pending writes stay queued in self.dirty
+            return settings
+
+    def update(self, user_id, **changes):
+        with self.lock:
+            settings = self.get(user_id)
+            for name, value in changes.items():
+                setattr(settings, name, value)
+            self.dirty[user_id] = settings
+            self._start_flusher()
+            return settings
+
+    def reset(self, user_id):
+        with self.lock:
+            self.cache[user_id] = UserSettings()
+            self.dirty[user_id] = None
+            self._start_flusher()
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            pending, self.dirty = self.dirty, {}
+            upserts = [(uid, *astuple(st)) for uid, st in pending.items() if st is not None]
+            deletes = [(uid,) for uid, st in pending.items() if st is None]
+            conn = self._db()
+            cols = ", ".join(f'"{c}"' for c in self.COLUMNS)
+            marks = ", ".join("?" for _ in self.COLUMNS)
+            with conn:
+                conn.executemany(f"INSERT OR REPLACE INTO user_settings (user_id, {cols}) VALUES (?, {marks})", upserts)
+                conn.executemany("DELETE FROM user_settings WHERE user_id = ?", deletes)
+
+settings_store = SettingsStore()
+atexit.register(settings_store.flush)
+
+def settings_key(settings):
+    # everything that changes the generated files, with defaults resolved the way process_numbers does
+    return astuple(replace(settings, limit=settings.limit or default_limit))
+
+class ResultCache:
+    # (file_unique_id, mode, settings tuple) -> file_ids of the documents sent back for it.
+    # Telegram keeps those files, so a repeat needs neither a download nor a conversion.
+    # Only touched from the event loop, so no locking.
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored at, file_ids)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored, file_ids = entry
+        if time.monotonic() - stored > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return file_ids
+
+    def put(self, key, file_ids):
+        file_ids = tuple(file_ids)
+        if not file_ids or self.max_entries <= 0:
+            return
+        self.entries[key] = (time.monotonic(), file_ids)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+result_cache = ResultCache()
 merge_data = {}
 conversion_mode = {}  # 🔥 for txt2vcf / vcf2txt
 
@@ -51,40 +261,894 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         pass
 
 # ✅ HELPERS
-def generate_vcf(numbers, filename="Contacts", contact_name="Contact", start_index=None, country_code="", group_num=None):
-    vcf_data = ""
+def iter_vcards(numbers, contact_name="Contact", start_index=None, country_code="", group_num=None):
+    suffix = f" (Group {group_num})" if group_num else ""
     for i, num in enumerate(numbers, start=(start_index if start_index else 1)):
-        if group_num:
-            name = f"{contact_name}{str(i).zfill(3)} (Group {group_num})"
-        else:
-            name = f"{contact_name}{str(i).zfill(3)}"
         formatted_num = f"{country_code}{num}" if country_code else num
-        vcf_data += f"BEGIN:VCARD\nVERSION:3.0\nFN:{name}\nTEL;TYPE=CELL:{formatted_num}\nEND:VCARD\n"
-    with open(f"{filename}.vcf", "w") as f:
-        f.write(vcf_data)
-    return f"{filename}.vcf"
-
-def extract_numbers_from_vcf(file_path):
-    numbers = set()
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    for card in content.split('END:VCARD'):
-        if 'TEL' in card:
-            tel_lines = [line for line in card.splitlines() if line.startswith('TEL')]
-            for line in tel_lines:
-                number = re.sub(r'[^0-9]', '', line.split(':')[-1].strip())
-                if number:
-                    numbers.add(number)
+        yield f"BEGIN:VCARD\nVERSION:3.0\nFN:{contact_name}{str(i).zfill(3)}{suffix}\nTEL;TYPE=CELL:{formatted_num}\nEND:VCARD\n"
+
+def write_text(dst, parts, batch_size=1024):
+    batch = []
+    for part in parts:
+        batch.append(part)
+        if len(batch) >= batch_size:
+            dst.write("".join(batch).encode("utf-8"))
+            batch.clear()
+    if batch:
+        dst.write("".join(batch).encode("utf-8"))
+
+def generate_vcf(numbers, filename="Contacts", contact_name="Contact", start_index=None, country_code="", group_num=None):
+    # built in memory: InputFile needs the bytes anyway, and the process pool ships them back pickled
+    buf = io.BytesIO()
+    write_text(buf, iter_vcards(numbers, contact_name, start_index, country_code, group_num))
+    return InputFile(buf.getvalue(), filename=f"{filename}.vcf")
+
+def iter_vcf_zips(chunks, filename="Contacts", max_bytes=ZIP_PART_MAX_BYTES):
+    # chunks: iterable of (vcf name, generate_vcf args); each entry is streamed straight into the archive.
+    # A new archive part starts when the next entry (sized like the largest one so far) would
+    # push it past max_bytes, so parts stay under the Bot API upload limit; one part keeps the plain name.
+    chunks = iter(chunks)
+    pending = next(chunks, None)
+    part = 0
+    largest = 0
+    while pending is not None:
+        part += 1
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            while pending is not None and (not zf.filelist or buf.tell() + largest <= max_bytes):
+                name, (numbers, contact_name, start_index, country_code, group_num) = pending
+                before = buf.tell()
+                with zf.open(f"{name}.vcf", "w") as dst:
+                    write_text(dst, iter_vcards(numbers, contact_name, start_index, country_code, group_num))
+                largest = max(largest, buf.tell() - before)
+                pending = next(chunks, None)
+        name = filename if part == 1 and pending is None else f"{filename}_part{part}"
+        data = buf.getvalue()
+        del buf  # only one copy of a part stays alive while the generator is suspended
+        yield InputFile(data, filename=f"{name}.zip")
+
+# ✅ NORMALIZATION (every input path ends here, whole batches at a time, regexes run over bytes)
+_SEPARATORS = b"+-.()"                                   # dropped inside a number in free text, never whitespace
+# digit groups shaped like dates, IPv4 addresses or decimals are blanked before the separators go,
+# so "2024-01-15" / "192.168.1.100" / "1234567.89" never collapse into a number. Starts on a
+# digit (with the lookbehind after it) so the regex engine can skip ahead on its first character.
+_NOT_PHONE = re.compile(rb"[0-9](?<![0-9.\-][0-9])(?:[0-9]{3}-[0-9]{1,2}-[0-9]{1,2}|[0-9]?[-./][0-9]{1,2}[-./][0-9]{2,4}"
+                        rb"|[0-9]{0,2}(?:\.[0-9]{1,3}){3}|[0-9]*\.[0-9]+)(?![.\-]?[0-9])")
+_DIGIT_RUN = re.compile(rb"(?<![0-9])[0-9]{%d,%d}(?![0-9])" % (MIN_NUMBER_LEN, MAX_NUMBER_LEN))
+_VALID_LINE = re.compile(rb"^[0-9]{%d,%d}$" % (MIN_NUMBER_LEN, MAX_NUMBER_LEN), re.M)
+_NON_DIGIT = re.compile(rb"[^0-9\n]+")
+_NUMBER_BYTES = frozenset(b"0123456789" + _SEPARATORS)
+_FLOAT_TAIL = re.compile(rb"\.0+$", re.M)               # numeric spreadsheet cells arrive as "9876543210.0"
+
+def strip_country_code(numbers, country_code=""):
+    cc = re.sub(r"\D", "", country_code or "")
+    if not cc:
+        return numbers
+    # already carries the configured code -> strip it so the writer doesn't prefix it twice
+    return [n[len(cc):] if n.startswith(cc) and len(n) - len(cc) >= NATIONAL_NUMBER_LEN else n
+            for n in numbers]
+
+def _decode_runs(runs, country_code=""):
+    if not runs:
+        return []
+    return strip_country_code(b"\n".join(runs).decode("ascii").split("\n"), country_code)
+
+def scan_numbers(data, country_code=""):
+    # free text (bytes): blank non-phone digit shapes, join "(987) 654-3210" style groups by dropping
+    # separators, then every 7-15 digit run is a number
+    started = time.perf_counter()
+    data = _NOT_PHONE.sub(b" ", data).replace(b") ", b")").translate(None, _SEPARATORS)
+    numbers = _decode_runs(_DIGIT_RUN.findall(data), country_code)
+    NORMALIZE_SECONDS.observe(time.perf_counter() - started)
+    return numbers
+
+def normalize_numbers(values, country_code=""):
+    # one number per value (spreadsheet cell, TEL value, command arg): keep only its digits
+    started = time.perf_counter()
+    cells = pd.Series(values, dtype=object).dropna().astype(str)
+    if cells.empty:
+        return []
+    data = "\n".join(cells.tolist()).encode("utf-8", errors="ignore")
+    numbers = _decode_runs(_VALID_LINE.findall(_NON_DIGIT.sub(b"", _FLOAT_TAIL.sub(b"", data))), country_code)
+    NORMALIZE_SECONDS.observe(time.perf_counter() - started)
     return numbers
 
-def extract_numbers_from_txt(file_path):
-    numbers = set()
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+def iter_normalized(values, country_code="", batch_size=NORMALIZE_BATCH):
+    it = iter(values)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return
+        yield from normalize_numbers(batch, country_code)
+
+def _tel_value(line, qp):
+    value = line.split(':')[-1].strip()
+    if qp:
+        value = quopri.decodestring(value.encode("utf-8")).decode("utf-8", errors="ignore")
+    return value
+
+# Parsers take a source: either a path or the downloaded bytes themselves.
+def is_inline(source):
+    return isinstance(source, (bytes, bytearray))
+
+def open_binary(source):
+    return io.BytesIO(source) if is_inline(source) else source
+
+def open_text(source):
+    if is_inline(source):
+        return io.TextIOWrapper(io.BytesIO(source), encoding='utf-8', errors='ignore')
+    return open(source, 'r', encoding='utf-8', errors='ignore')
+
+def iter_numbers_from_vcf(source):
+    return iter_normalized(iter_vcf_tel_values(source))
+
+def iter_vcf_tel_values(source):
+    # Line-oriented vCard tokenizer: unfolds RFC 6350 continuation lines and
+    # quoted-printable soft breaks, but only ever buffers the current TEL property,
+    # so PHOTO/base64 payloads are skipped line by line instead of being loaded.
+    tel = None
+    qp = soft = b64 = False
+    with open_text(source) as f:
         for line in f:
-            nums = re.findall(r'\d{7,}', line)
-            numbers.update(nums)
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t"):
+                if tel is not None:
+                    tel += line[1:]
+                continue
+            if soft:
+                soft = line.endswith("=")
+                if tel is not None:
+                    tel = tel[:-1] + line
+                continue
+            if b64:
+                # vCard 2.1 base64 bodies run unindented until a blank line
+                if line and ":" not in line:
+                    continue
+                b64 = False
+            if tel is not None:
+                yield _tel_value(tel, qp)
+                tel = None
+            head, sep, _ = line.partition(":")
+            if not sep:
+                continue
+            name = head.split(";", 1)[0].rsplit(".", 1)[-1].upper()  # item1.TEL -> TEL
+            params = head.upper()
+            qp = "QUOTED-PRINTABLE" in params
+            soft = qp and line.endswith("=")
+            b64 = "BASE64" in params or "ENCODING=B" in params
+            if name == "TEL":
+                tel = line
+    if tel is not None:
+        yield _tel_value(tel, qp)
+
+def extract_numbers_from_vcf(source):
+    return NumberSet(iter_numbers_from_vcf(source))
+
+def iter_numbers_from_txt(source, block_size=TXT_SCAN_BLOCK):
+    # scans raw bytes (downloaded, or the mmapped file) block by block; nothing is decoded line by line
+    if is_inline(source):
+        yield from scan_blocks(source, block_size)
+        return
+    with open(source, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from scan_blocks(mm, block_size)
+
+def _in_number(buf, i):
+    # byte i may be part of a number: a digit or separator, or the space in "(987) 654"
+    b = buf[i]
+    return b in _NUMBER_BYTES or (b == 0x20 and i > 0 and buf[i - 1] == 0x29)
+
+def scan_blocks(buf, block_size=TXT_SCAN_BLOCK):
+    size = len(buf)
+    pos = 0
+    while pos < size:
+        end = min(pos + block_size, size)
+        if end < size:
+            # back up so a number running across the block edge is scanned whole in the next block
+            cut = end
+            while cut > pos and _in_number(buf, cut - 1):
+                cut -= 1
+            if cut > pos:
+                end = cut
+            else:
+                # the whole block is one run: extend it to the run's end instead
+                while end < size and _in_number(buf, end):
+                    end += 1
+        yield from scan_numbers(bytes(buf[pos:end]))
+        pos = end
+
+def extract_numbers_from_txt(source):
+    return NumberSet(iter_numbers_from_txt(source))
+
+def detect_number_column(rows):
+    # rows: sampled rows including the first (possible header) row -> (column index, has_header)
+    header = rows[0]
+    body = rows[1:] or rows
+    scores = []
+    for i in range(max(len(r) for r in rows)):
+        values = [r[i] for r in body if i < len(r) and r[i] is not None and r[i] == r[i]]
+        scores.append(len(normalize_numbers(values)) / len(values) if values else 0.0)
+    # a number-ish header only counts if the values under it are numbers too ("Number" may be a row id)
+    for i, name in enumerate(header):
+        if isinstance(name, str) and name.strip().lower() in NUMBER_HEADERS and scores[i] >= 0.5:
+            return i, True
+    best, best_score = None, 0.0
+    for i, score in enumerate(scores):
+        if score > best_score:
+            best, best_score = i, score
+    if best is None or best_score < 0.5:
+        raise ValueError("no column with phone numbers found")
+    has_header = best < len(header) and not normalize_numbers([header[best]])
+    return best, has_header
+
+def iter_numbers_from_csv(source):
+    sample = pd.read_csv(open_binary(source), header=None, dtype=str, nrows=TABLE_SAMPLE_ROWS,
+                         encoding='utf-8', encoding_errors='ignore')
+    if sample.empty:
+        return
+    col, has_header = detect_number_column(sample.values.tolist())
+    reader = pd.read_csv(open_binary(source), header=None, usecols=[col], dtype=str, chunksize=TABLE_CHUNK_ROWS,
+                         skiprows=1 if has_header else 0, encoding='utf-8', encoding_errors='ignore')
+    with reader:
+        for chunk in reader:
+            yield from normalize_numbers(chunk[col])
+
+def iter_numbers_from_xlsx(source):
+    wb = openpyxl.load_workbook(open_binary(source), read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        sample = list(islice(rows, TABLE_SAMPLE_ROWS))
+        if not sample:
+            return
+        col, has_header = detect_number_column(sample)
+        values = (r[col] if col < len(r) else None for r in chain(sample[1 if has_header else 0:], rows))
+        yield from iter_normalized(values)
+    finally:
+        wb.close()
+
+# ✅ PIPELINE (parser -> de-dup -> chunker -> writer, one chunk in memory at a time)
+def iter_unique(numbers):
+    seen = NumberSet()
+    for batch in iter_chunks(numbers, NORMALIZE_BATCH):
+        yield from seen.add_new(batch)
+
+def iter_chunks(items, size):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+# ✅ NUMBER SET (a normalized number is packed into an int64 key that reads as "1" + digits,
+# so leading zeros survive; MAX_NUMBER_LEN up to 18 fits)
+_KEY_DTYPE = f"S{MAX_NUMBER_LEN}"
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+def encode_numbers(numbers):
+    if not len(numbers):
+        return np.empty(0, dtype=np.int64)
+    raw = np.array(numbers, dtype=_KEY_DTYPE)
+    return raw.astype(np.int64) + _POW10[np.char.str_len(raw)]
+
+def decode_numbers(keys):
+    return [str(k)[1:] for k in keys.tolist()]
+
+class NumberSet:
+    # Sorted unique int64 keys: ~8 bytes per number instead of a ~60 byte str in a set,
+    # and membership/de-dup of a whole batch is a few vectorized passes. Iterates in sorted order.
+    def __init__(self, numbers=()):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.update(numbers)
+
+    def __len__(self):
+        return int(self.keys.size)
+
+    def __iter__(self):
+        for i in range(0, self.keys.size, NORMALIZE_BATCH):
+            yield from decode_numbers(self.keys[i:i + NORMALIZE_BATCH])
+
+    def __contains__(self, number):
+        return bool(self.contains([number])[0])
+
+    def contains(self, numbers):
+        return self.contains_keys(encode_numbers(numbers))
+
+    def contains_keys(self, keys):
+        return self._locate(keys)[1]
+
+    def _locate(self, keys):
+        pos = np.searchsorted(self.keys, keys)
+        found = pos < self.keys.size
+        found[found] = self.keys[pos[found]] == keys[found]
+        return pos, found
+
+    def update(self, numbers):
+        for batch in iter_chunks(numbers, NORMALIZE_BATCH):
+            self.add_keys(encode_numbers(batch))
+
+    def add_keys(self, keys):
+        # -> positions in `keys` of the keys that were new, first occurrence only, in order
+        uniq, first = np.unique(keys, return_index=True)
+        pos, found = self._locate(uniq)
+        fresh = ~found
+        self.keys = np.insert(self.keys, pos[fresh], uniq[fresh])
+        return np.sort(first[fresh])
+
+    def add_new(self, numbers):
+        # -> the numbers not seen before, in order, each once
+        return [numbers[i] for i in self.add_keys(encode_numbers(numbers)).tolist()]
+
+class SpillingDeduper:
+    # Remembers every key seen so far: a NumberSet until `budget` keys, after that a
+    # SQLite table in `spill_dir`, checked one whole batch at a time.
+    def __init__(self, budget=MERGE_MEMORY_NUMBERS, spill_dir=None):
+        self.budget = budget
+        self.spill_dir = spill_dir
+        self.seen = NumberSet()
+        self.conn = None
+        self.path = None
+
+    def _spill(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db", dir=self.spill_dir)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE seen (num INTEGER PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE batch (pos INTEGER PRIMARY KEY, num INTEGER)")
+        with self.conn:
+            self.conn.executemany("INSERT INTO seen VALUES (?)", ((k,) for k in self.seen.keys.tolist()))
+        self.seen = None
+
+    def add(self, keys):
+        # -> the keys of this batch not seen before, in order, each once
+        if self.conn is None:
+            fresh = keys[self.seen.add_keys(keys)]
+            if len(self.seen) > self.budget:
+                self._spill()
+            return fresh
+        _, first = np.unique(keys, return_index=True)
+        with self.conn:
+            self.conn.executemany("INSERT INTO batch (num) VALUES (?)", ((k,) for k in keys[np.sort(first)].tolist()))
+            fresh = [row[0] for row in self.conn.execute(
+                "SELECT num FROM batch WHERE num NOT IN (SELECT num FROM seen) ORDER BY pos")]
+            self.conn.execute("INSERT OR IGNORE INTO seen SELECT num FROM batch")
+            self.conn.execute("DELETE FROM batch")
+        return np.array(fresh, dtype=np.int64)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            os.remove(self.path)
+            self.conn = None
+        self.seen = None
+
+# ✅ TELEGRAM REQUESTS
+class InstrumentedRequest(HTTPXRequest):
+    # times every Bot API call by method and counts failures (transport errors and HTTP >= 400)
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api = "download" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except TelegramError as e:
+            TELEGRAM_ERRORS.labels(api, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_SECONDS.labels(api).observe(time.perf_counter() - started)
+        if code >= 400:
+            TELEGRAM_ERRORS.labels(api, str(code)).inc()
+        return code, payload
+
+def telegram_request():
+    # the pool size ApplicationBuilder would use for its own default request
+    return InstrumentedRequest(connection_pool_size=256)
+
+# ✅ UPLOAD SCHEDULER
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class UploadScheduler:
+    # Renders up to `window` files ahead on a per-job thread while earlier ones upload.
+    # Messages to one chat are sent strictly in order (Telegram orders by arrival),
+    # different chats upload concurrently, bounded by `concurrency` and the global bucket.
+    def __init__(self, window=UPLOAD_WINDOW, concurrency=UPLOAD_CONCURRENCY, chat_rate=UPLOAD_CHAT_RATE,
+                 chat_burst=UPLOAD_CHAT_BURST, global_rate=UPLOAD_GLOBAL_RATE, retries=UPLOAD_RETRIES):
+        self.window = max(1, window)
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.retries = retries
+        self.chat_buckets = {}
+        self.inflight = None
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def send(self, message, document):
+        if self.inflight is None:
+            self.inflight = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            await self._chat_bucket(message.chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                async with self.inflight:
+                    sent = await message.reply_document(document=document)
+                UPLOAD_SECONDS.observe(time.perf_counter() - started)
+                if isinstance(document, InputFile):
+                    BYTES_OUT.inc(len(document.input_file_content))
+                return sent
+            except RetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(e.retry_after + 0.5)
+            except TimedOut:
+                # the upload may still have gone through; retrying could duplicate the file
+                raise
+            except BadRequest:
+                raise  # rejected outright (bad file_id, too large...), a retry can't help
+            except NetworkError:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def send_documents(self, message, documents, progress=None, window=None):
+        # documents: lazy iterable of InputFiles. It is driven on a render thread, up to `window`
+        # files ahead of the upload, so normalizing, de-duplicating, chunking and rendering
+        # never run on the event loop; the loop only awaits finished files.
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Queue(window or self.window)
+        stop = threading.Event()
+        threading.Thread(target=self._render_ahead, args=(loop, iter(documents), ready, stop, progress),
+                         name="render", daemon=True).start()
+        sent = []
+        try:
+            while True:
+                document, error = await ready.get()
+                if error is not None:
+                    raise error
+                if document is None:
+                    return sent
+                sent.append(await self.send(message, document))
+                if progress is not None:
+                    progress.uploaded += 1
+        finally:
+            stop.set()
+            while not ready.empty():
+                ready.get_nowait()  # frees a render thread blocked on a full queue so it sees `stop`
+
+    @staticmethod
+    def _render_ahead(loop, documents, ready, stop, progress):
+        def hand_over(item):
+            asyncio.run_coroutine_threadsafe(ready.put(item), loop).result()
+
+        last = (None, None)
+        try:
+            while not stop.is_set():
+                # each file's chunking and rendering holds a CPU slot, its upload does not
+                asyncio.run_coroutine_threadsafe(cpu_slots.acquire(), loop).result()
+                started = time.perf_counter()
+                try:
+                    document = None if stop.is_set() else next(documents, None)
+                finally:
+                    loop.call_soon_threadsafe(cpu_slots.release)
+                if document is None:
+                    break
+                RENDER_SECONDS.observe(time.perf_counter() - started)
+                if progress is not None:
+                    progress.rendered += 1
+                hand_over((document, None))
+        except Exception as e:
+            last = (None, e)
+        finally:
+            close = getattr(documents, "close", None)
+            if close is not None:
+                close()
+        if not stop.is_set():
+            hand_over(last)
+
+uploader = UploadScheduler()
+
+async def send_cached(message, key):
+    # True if the cached result was re-sent; False means the caller has to do the work
+    file_ids = result_cache.get(key)
+    if not file_ids:
+        return False
+    for i, file_id in enumerate(file_ids):
+        try:
+            await uploader.send(message, file_id)
+        except BadRequest:
+            result_cache.discard(key)
+            if i:
+                raise  # part of the result already went out, a full rerun would duplicate it
+            return False
+    return True
+
+class ConversionBusy(Exception):
+    pass
+
+class ConversionExecutor:
+    # Each user gets at most `per_user` workers so one big upload can't starve everyone else;
+    # beyond `max_queue` outstanding jobs new work is refused instead of piling up.
+    def __init__(self, kind=CONVERT_EXECUTOR, workers=CONVERT_WORKERS, max_queue=CONVERT_MAX_QUEUE,
+                 per_user=CONVERT_PER_USER):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.pool = None
+        self.queued = 0
+        self.user_slots = {}
+        self.user_futures = {}
+
+    def _pool(self):
+        if self.pool is None:
+            if self.kind == "process":
+                # spawn: the bot process runs threads (render pool, dashboard) that fork would copy mid-lock
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="convert")
+        return self.pool
+
+    async def run(self, user_id, fn, *args):
+        if self.queued >= self.max_queue:
+            raise ConversionBusy()
+        self.queued += 1
+        slot = self.user_slots.get(user_id)
+        if slot is None:
+            slot = self.user_slots[user_id] = asyncio.Semaphore(self.per_user)
+        try:
+            async with slot:
+                pool = self._pool()
+                try:
+                    fut = pool.submit(fn, *args)
+                except BrokenProcessPool:
+                    self._discard(pool)
+                    raise ConversionBusy()
+                futures = self.user_futures.setdefault(user_id, set())
+                futures.add(fut)
+                try:
+                    return await asyncio.wrap_future(fut)
+                except asyncio.CancelledError:
+                    fut.cancel()
+                    raise
+                except BrokenProcessPool:
+                    # a worker died (e.g. OOM-killed mid-parse): the next job gets a fresh pool,
+                    # this one is answered like any other "busy" so the user can resend
+                    self._discard(pool)
+                    raise ConversionBusy()
+                finally:
+                    futures.discard(fut)
+                    if not futures:
+                        self.user_futures.pop(user_id, None)
+        finally:
+            self.queued -= 1
+
+    def _discard(self, pool):
+        if self.pool is pool:
+            self.shutdown()
+
+    def cancel(self, user_id):
+        # jobs already running in a worker finish, their result is simply dropped
+        for fut in list(self.user_futures.get(user_id, ())):
+            fut.cancel()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+converter = ConversionExecutor()
+
+class JobProgress:
+    # Counters are bumped freely by the job; a ticker turns them into one status message,
+    # edited at most every `interval` seconds. Jobs done within the first interval never post one.
+    def __init__(self, message, interval=PROGRESS_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self.stage = "Queued"
+        self.parsed = None
+        self.files = None  # expected number of files, once known
+        self.rendered = 0
+        self.uploaded = 0
+        self.status = None
+        self.shown = None
+
+    def text(self):
+        lines = [f"⏳ {self.stage}"]
+        if self.parsed is not None:
+            lines.append(f"Parsed: {self.parsed} numbers")
+        if self.rendered or self.uploaded:
+            of = f"/{self.files}" if self.files else ""
+            lines.append(f"Rendered: {self.rendered}{of} files")
+            lines.append(f"Uploaded: {self.uploaded}{of} files")
+        return "\n".join(lines)
+
+    async def publish(self, text=None):
+        text = text or self.text()
+        if text == self.shown:
+            return
+        try:
+            if self.status is None:
+                self.status = await self.message.reply_text(text)
+            else:
+                await self.status.edit_text(text)
+            self.shown = text
+        except TelegramError:
+            pass  # flood limit or message deleted: the next tick tries again
+
+    async def tick(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.publish()
+
+    async def finish(self, text):
+        if self.status is not None:
+            await self.publish(text)
+
+class CpuSlots:
+    # Caps the CPU stages of all jobs (parsing in the converter, chunking and rendering on the
+    # render threads), FIFO; download and upload pacing never hold a slot. Used with `async with`
+    # on the loop; render threads run acquire() through the loop and release via call_soon_threadsafe.
+    def __init__(self, limit=JOB_HEAVY_LIMIT):
+        self.limit = limit
+        self.sem = None
+
+    async def acquire(self):
+        if self.sem is None:
+            self.sem = asyncio.Semaphore(self.limit)
+        await self.sem.acquire()
+
+    def release(self):
+        self.sem.release()
+
+    @asynccontextmanager
+    async def held(self, progress=None, stage="Working…"):
+        if progress is not None:
+            progress.stage = "Waiting for a free worker…"
+        await self.acquire()
+        try:
+            if progress is not None:
+                progress.stage = stage
+            yield
+        finally:
+            self.release()
+
+cpu_slots = CpuSlots()
+
+class JobQueue:
+    # One worker task per user drains that user's jobs in order, so a resend or a /done
+    # never races the previous upload; the CPU stages inside a job take a cpu_slots slot.
+    def __init__(self, per_user=JOB_QUEUE_MAX):
+        self.per_user = per_user
+        self.queues = {}   # user_id -> deque of (key, update, context, job)
+        self.workers = {}  # user_id -> worker task
+        self.running = {}  # user_id -> (worker task, key of the job in flight)
+
+    def pending(self, user_id):
+        return len(self.queues.get(user_id, ())) + (user_id in self.running)
+
+    async def submit(self, update, context, job, key=None):
+        # job: async callable taking a JobProgress; key: identifies duplicate submissions (file_unique_id)
+        # -> False if the job was refused (duplicate or queue full)
+        user_id = update.effective_user.id
+        queue = self.queues.setdefault(user_id, deque())
+        if key is not None and (self.running.get(user_id, (None, None))[1] == key or any(k == key for k, *_ in queue)):
+            await update.message.reply_text("⏳ Already working on this file.")
+            return False
+        if len(queue) >= self.per_user:
+            await update.message.reply_text("⏳ Too many jobs queued, wait for the current ones or /cancel.")
+            return False
+        ahead = self.pending(user_id)
+        queue.append((key, update, context, job))
+        if user_id not in self.workers:
+            self.workers[user_id] = asyncio.create_task(self._drain(user_id, queue))
+        elif ahead:
+            await update.message.reply_text(f"🕒 Queued, {ahead} job(s) ahead of this one.")
+        return True
+
+    async def _drain(self, user_id, queue):
+        me = asyncio.current_task()
+        try:
+            while queue:
+                key, update, context, job = queue.popleft()
+                self.running[user_id] = (me, key)
+                progress = JobProgress(update.message)
+                ticker = asyncio.create_task(progress.tick())
+                try:
+                    progress.stage = "Working…"
+                    await job(progress=progress)
+                    await progress.finish("✅ Done")
+                except asyncio.CancelledError:
+                    await progress.finish("🛑 Cancelled")
+                    raise
+                except Exception as e:
+                    await progress.finish("❌ Failed")
+                    await context.application.process_error(update, e)
+                finally:
+                    ticker.cancel()
+                    if self.running.get(user_id, (None,))[0] is me:
+                        self.running.pop(user_id)
+        finally:
+            if self.workers.get(user_id) is me:
+                self.workers.pop(user_id)
+            if self.queues.get(user_id) is queue and not queue:
+                self.queues.pop(user_id)
+
+    def cancel(self, user_id):
+        # -> number of jobs dropped or stopped
+        count = len(self.queues.pop(user_id, ()))
+        worker = self.workers.pop(user_id, None)
+        if worker is not None:
+            worker.cancel()
+            count += user_id in self.running
+        converter.cancel(user_id)
+        return count
+
+jobs = JobQueue()
+
+# Job functions below run inside the executor, so they must stay top-level and picklable.
+def convert_txt_to_vcf(source, filename):
+    numbers = extract_numbers_from_txt(source)
+    return generate_vcf(numbers, filename, "Contact") if numbers else None
+
+def convert_vcf_to_txt(source, filename):
+    numbers = list(iter_unique(iter_numbers_from_vcf(source)))
+    return InputFile("\n".join(numbers), filename=f"{filename}.txt") if numbers else None
+
+def iter_source_numbers(source, name):
+    # -> lazy iterator of the file's numbers, repeats included, or None if the type is unsupported
+    name = name.lower()
+    if name.endswith('.csv'):
+        numbers = iter_numbers_from_csv(source)
+    elif name.endswith('.xlsx'):
+        numbers = iter_numbers_from_xlsx(source)
+    elif name.endswith('.txt'):
+        numbers = iter_numbers_from_txt(source)
+    elif name.endswith('.vcf'):
+        numbers = iter_numbers_from_vcf(source)
+    else:
+        return None
     return numbers
 
+def load_numbers(source, name, country_code=""):
+    # -> the file's numbers ready for the writer (country code stripped, unique), or None if unsupported;
+    # all of it happens here in the worker so only unique numbers cross the process boundary
+    numbers = iter_source_numbers(source, name)
+    if numbers is None:
+        return None
+    if country_code:
+        numbers = chain.from_iterable(strip_country_code(batch, country_code)
+                                      for batch in iter_chunks(numbers, NORMALIZE_BATCH))
+    return list(iter_unique(numbers))
+
+def load_number_keys(source, name, out_path):
+    # merge sessions keep each file as packed keys (8 bytes a number) in an .npy in the user's
+    # scratch dir until /done, so nothing piles up in the bot process
+    # -> numbers in the file counting repeats (unique keys in first-seen order go to out_path), or None
+    numbers = iter_source_numbers(source, name)
+    if numbers is None:
+        return None
+    seen = NumberSet()
+    parts = []
+    count = 0
+    for batch in iter_chunks(numbers, NORMALIZE_BATCH):
+        count += len(batch)
+        keys = encode_numbers(batch)
+        parts.append(keys[seen.add_keys(keys)])
+    np.save(out_path, np.concatenate(parts) if parts else encode_numbers([]))
+    return count
+
+def merge_sources(sources, user_id, country_code="", budget=MERGE_MEMORY_NUMBERS, batch_size=NORMALIZE_BATCH):
+    # sources: [(file name, .npy of encoded number keys, numbers in the file)] in upload order
+    # -> (scratch file with the merged numbers one per line, ready for the writer: country code
+    #     stripped and unique; unique count; [(file name, numbers, new)])
+    spill_dir = scratch_dir(user_id)
+    dedup = SpillingDeduper(budget, spill_dir)
+    stats = []
+    total = 0
+    out = tempfile.NamedTemporaryFile("w", dir=spill_dir, suffix=".txt", delete=False)
+    try:
+        with out:
+            for name, keys_path, count in sources:
+                keys = np.load(keys_path, mmap_mode="r")
+                fresh_count = 0
+                for i in range(0, len(keys), batch_size):
+                    batch = np.asarray(keys[i:i + batch_size])
+                    if country_code:
+                        # stripping can turn two spellings into one number, so it happens before the de-dup
+                        batch = encode_numbers(strip_country_code(decode_numbers(batch), country_code))
+                    fresh = dedup.add(batch)
+                    fresh_count += len(fresh)
+                    if len(fresh):
+                        out.write("\n".join(decode_numbers(fresh)))
+                        out.write("\n")
+                stats.append((name, count, fresh_count))
+                total += fresh_count
+    except BaseException:
+        os.remove(out.name)
+        raise
+    finally:
+        dedup.close()
+    return out.name, total, stats
+
+def new_merge_session(filename="Merged"):
+    return {"sources": [], "filename": filename, "touched": time.monotonic(), "closed": False}
+
+def close_merge_session(session):
+    # the session's saved keys go with it; jobs still holding it see `closed` and drop their file
+    session["closed"] = True
+    for _, keys_path, _ in session["sources"]:
+        try:
+            os.remove(keys_path)
+        except OSError:
+            pass
+    session["sources"] = []
+
+def expire_merge_sessions():
+    now = time.monotonic()
+    for user_id, session in list(merge_data.items()):
+        if now - session["touched"] > MERGE_SESSION_TTL:
+            close_merge_session(merge_data.pop(user_id))
+
+# ✅ DOWNLOADS
+def scratch_dir(user_id):
+    path = os.path.join(SCRATCH_DIR, str(user_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def clear_scratch():
+    # anything left here belongs to a previous run that died mid-download
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+@asynccontextmanager
+async def downloaded(bot, document, user_id):
+    # yields a parser source: the bytes for small files, else a scratch path removed on exit
+    started = time.perf_counter()
+    tg_file = await bot.get_file(document.file_id)
+    size = document.file_size or tg_file.file_size
+    if size and size <= DOWNLOAD_MEMORY_MAX:
+        data = await tg_file.download_as_bytearray()
+        DOWNLOAD_SECONDS.observe(time.perf_counter() - started)
+        BYTES_IN.inc(len(data))
+        yield data
+        return
+    suffix = os.path.splitext(document.file_name or "")[1]
+    with tempfile.NamedTemporaryFile(dir=scratch_dir(user_id), suffix=suffix) as f:
+        await tg_file.download_to_memory(out=f)
+        f.flush()
+        DOWNLOAD_SECONDS.observe(time.perf_counter() - started)
+        BYTES_IN.inc(f.tell())
+        yield f.name
+
+def too_large(document):
+    return bool(document.file_size) and document.file_size > DOWNLOAD_MAX_BYTES
+
 # ✅ TXT2VCF & VCF2TXT (with custom name support)
 async def txt2vcf(update: Update, context: ContextTypes.DEFAULT_TYPE):
     conversion_mode[update.effective_user.id] = "txt2vcf"
@@ -120,11 +1184,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/setvcfstart [ VCF NUMBERING START ]\n"
         "/setcountrycode [ +91 / +1 / +44 ]\n"
         "/setgroup [ START NUMBER ]\n"
+        "/setzip [ ON / OFF / AUTO ]\n"
         "/makevcf [ NAME 9876543210 9876543211 ... ]\n"
         "/merge [ VCF NAME SET ]\n"
         "/done [ AFTER FILE SET ]\n"
         "/txt2vcf → [ Convert TXT file to VCF ]\n"
-        "/vcf2txt → [ Convert VCF file to TXT ]\n\n"
+        "/vcf2txt → [ Convert VCF file to TXT ]\n"
+        "/cancel → [ Stop running / queued jobs ]\n\n"
         "🧹 Reset & Settings:\n"
         "/reset → sab settings default par le aao\n"
         "/mysettings → apne current settings dekho\n\n"
@@ -146,169 +1212,302 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     file = update.message.document
-    path = f"{file.file_unique_id}_{file.file_name}"
-    await (await context.bot.get_file(file.file_id)).download_to_drive(path)
     user_id = update.effective_user.id
 
-    # ✅ Merge mode
+    if too_large(file):
+        await update.message.reply_text(
+            f"❌ File too large ({file.file_size // (1024 * 1024)} MB). Max is {DOWNLOAD_MAX_BYTES // (1024 * 1024)} MB."
+        )
+        return
+
+    expire_merge_sessions()
+    # the mode is decided now, in arrival order, even if the job only runs later;
+    # a file of the wrong type is turned away here, before it is queued or downloaded
+    name = (file.file_name or "").lower()
+    if user_id not in merge_data and user_id in conversion_mode:
+        expected = ".txt" if conversion_mode[user_id] == "txt2vcf" else ".vcf"
+        if not name.endswith(expected):
+            conversion_mode.pop(user_id, None)
+            conversion_mode.pop(f"{user_id}_name", None)
+            await update.message.reply_text("❌ Wrong file type for this command.")
+            return
+    elif not name.endswith(SUPPORTED_EXTENSIONS):
+        await update.message.reply_text("Unsupported file type.")
+        return
+
     if user_id in merge_data:
-        merge_data[user_id]["files"].append(path)
-        await update.message.reply_text(f"📥 File added for merge: {file.file_name}")
+        job = partial(add_merge_file, update, context, merge_data[user_id])
+    elif user_id in conversion_mode:
+        mode = conversion_mode.pop(user_id)
+        filename = conversion_mode.pop(f"{user_id}_name", "Converted")
+        if not await jobs.submit(update, context, partial(convert_file, update, context, mode, filename),
+                                 key=file.file_unique_id):
+            # refused: keep the mode so the resend is converted too
+            conversion_mode.setdefault(user_id, mode)
+            conversion_mode.setdefault(f"{user_id}_name", filename)
+        return
+    else:
+        job = partial(process_file, update, context)
+    await jobs.submit(update, context, job, key=file.file_unique_id)
+
+# ✅ Merge mode (files are parsed on arrival, only their numbers are kept until /done)
+async def add_merge_file(update, context, session, progress):
+    file = update.message.document
+    user_id = update.effective_user.id
+    if session["closed"]:
+        await update.message.reply_text("❌ That merge was cancelled or expired, start again with /merge.")
+        return
+    if len(session["sources"]) >= MERGE_MAX_FILES:
+        await update.message.reply_text(f"❌ A merge takes at most {MERGE_MAX_FILES} files, send /done.")
+        return
+    fd, keys_path = tempfile.mkstemp(dir=scratch_dir(user_id), suffix=".npy")
+    os.close(fd)
+    try:
+        progress.stage = "Downloading…"
+        async with downloaded(context.bot, file, user_id) as source:
+            async with cpu_slots.held(progress, "Parsing…"):
+                started = time.perf_counter()
+                count = await converter.run(user_id, load_number_keys, source, (file.file_name or "").lower(),
+                                            keys_path)
+            PARSE_SECONDS.observe(time.perf_counter() - started)
+        if session["closed"] or not count:
+            os.remove(keys_path)
+    except ConversionBusy:
+        os.remove(keys_path)
+        await update.message.reply_text("⏳ Bot is busy right now, please send the file again in a minute.")
+        return
+    except BaseException:
+        os.remove(keys_path)
+        raise
+    if count is None:
+        await update.message.reply_text("Unsupported file type.")
+        return
+    if not count:
+        await update.message.reply_text(f"❌ No numbers found in {file.file_name}.")
+        return
+    if session["closed"]:
+        await update.message.reply_text("❌ That merge was cancelled or expired, start again with /merge.")
+        return
+    progress.parsed = count
+    session["sources"].append((file.file_name, keys_path, count))
+    session["touched"] = time.monotonic()
+    await update.message.reply_text(f"📥 File added for merge: {file.file_name}")
+
+# ✅ Conversion modes
+async def convert_file(update, context, mode, filename, progress):
+    file = update.message.document
+    name = (file.file_name or "").lower()
+    user_id = update.effective_user.id
+    cache_key = (file.file_unique_id, mode, (filename,))
+    if await send_cached(update.message, cache_key):
         return
 
-    # ✅ Conversion modes
-    if user_id in conversion_mode:
-        mode = conversion_mode[user_id]
-
-        if mode == "txt2vcf" and path.endswith(".txt"):
-            numbers = extract_numbers_from_txt(path)
-            if numbers:
-                filename = conversion_mode.get(f"{user_id}_name", "Converted")
-                vcf_path = generate_vcf(list(numbers), filename, "Contact")
-                await update.message.reply_document(document=open(vcf_path, "rb"))
-                os.remove(vcf_path)
+    try:
+        if mode == "txt2vcf" and name.endswith(".txt"):
+            progress.stage = "Downloading…"
+            async with downloaded(context.bot, file, user_id) as source:
+                async with cpu_slots.held(progress, "Converting…"):
+                    started = time.perf_counter()
+                    document = await converter.run(user_id, convert_txt_to_vcf, source, filename)
+                PARSE_SECONDS.observe(time.perf_counter() - started)
+            if document:
+                sent = await uploader.send(update.message, document)
+                result_cache.put(cache_key, [sent.document.file_id])
             else:
                 await update.message.reply_text("❌ No numbers found in TXT file.")
 
-        elif mode == "vcf2txt" and path.endswith(".vcf"):
-            numbers = extract_numbers_from_vcf(path)
-            if numbers:
-                filename = conversion_mode.get(f"{user_id}_name", "Converted")
-                txt_path = f"{filename}.txt"
-                with open(txt_path, "w") as f:
-                    f.write("\n".join(numbers))
-                await update.message.reply_document(document=open(txt_path, "rb"))
-                os.remove(txt_path)
+        elif mode == "vcf2txt" and name.endswith(".vcf"):
+            progress.stage = "Downloading…"
+            async with downloaded(context.bot, file, user_id) as source:
+                async with cpu_slots.held(progress, "Converting…"):
+                    started = time.perf_counter()
+                    document = await converter.run(user_id, convert_vcf_to_txt, source, filename)
+                PARSE_SECONDS.observe(time.perf_counter() - started)
+            if document:
+                sent = await uploader.send(update.message, document)
+                result_cache.put(cache_key, [sent.document.file_id])
             else:
                 await update.message.reply_text("❌ No numbers found in VCF file.")
 
         else:
             await update.message.reply_text("❌ Wrong file type for this command.")
+    except ConversionBusy:
+        # keep the mode so the resend is converted too
+        conversion_mode.setdefault(user_id, mode)
+        conversion_mode.setdefault(f"{user_id}_name", filename)
+        await update.message.reply_text("⏳ Bot is busy right now, please send the file again in a minute.")
 
-        conversion_mode.pop(user_id, None)
-        conversion_mode.pop(f"{user_id}_name", None)
-        if os.path.exists(path):
-            os.remove(path)
+# ✅ fallback: normal handling
+async def process_file(update, context, progress):
+    file = update.message.document
+    user_id = update.effective_user.id
+    settings = settings_store.get(user_id)
+    cache_key = (file.file_unique_id, "vcf", settings_key(settings))
+    if await send_cached(update.message, cache_key):
         return
 
-    # ✅ fallback: normal handling
     try:
-        if path.endswith('.csv'):
-            df = pd.read_csv(path, encoding='utf-8')
-        elif path.endswith('.xlsx'):
-            df = pd.read_excel(path)
-        elif path.endswith('.txt'):
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            numbers = [''.join(filter(str.isdigit, w)) for w in content.split() if len(w) >= 7]
-            df = pd.DataFrame({'Numbers': numbers})
-        elif path.endswith('.vcf'):
-            numbers = extract_numbers_from_vcf(path)
-            df = pd.DataFrame({'Numbers': list(numbers)})
-        else:
+        progress.stage = "Downloading…"
+        async with downloaded(context.bot, file, user_id) as source:
+            async with cpu_slots.held(progress, "Parsing…"):
+                started = time.perf_counter()
+                numbers = await converter.run(user_id, load_numbers, source, (file.file_name or "").lower(),
+                                              settings.country_code)
+            PARSE_SECONDS.observe(time.perf_counter() - started)
+        if numbers is None:
             await update.message.reply_text("Unsupported file type.")
             return
-        await process_numbers(update, context, df['Numbers'].dropna().astype(str).tolist())
+        if not numbers:
+            await update.message.reply_text("❌ No numbers found in the file.")
+            return
+        # parsed, normalized and de-duplicated in the worker: the bot process only chunks and renders
+        sent = await process_numbers(update, context, numbers, progress=progress, prepared=True)
+        result_cache.put(cache_key, [m.document.file_id for m in sent])
+    except ConversionBusy:
+        await update.message.reply_text("⏳ Bot is busy right now, please send the file again in a minute.")
     except Exception as e:
         await update.message.reply_text(f"Error processing file: {str(e)}")
-    finally:
-        if os.path.exists(path):
-            os.remove(path)
 
 # ✅ HANDLE TEXT
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_authorized(update.effective_user.id): return
-    numbers = [''.join(filter(str.isdigit, w)) for w in update.message.text.split() if len(w) >=7]
+    numbers = scan_numbers(update.message.text.encode("utf-8"))
     if numbers:
-        await process_numbers(update, context, numbers)
+        await jobs.submit(update, context, partial(process_numbers, update, context, numbers))
     else:
         await update.message.reply_text("No valid numbers found.")
 
+# ✅ CANCEL
+async def cancel_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    stopped = jobs.cancel(user_id)
+    modes = [merge_data.pop(user_id, None), conversion_mode.pop(user_id, None)]
+    if modes[0] is not None:
+        close_merge_session(modes[0])
+    conversion_mode.pop(f"{user_id}_name", None)
+    if stopped or any(m is not None for m in modes):
+        await update.message.reply_text(f"🛑 Cancelled ({stopped} job(s) stopped).")
+    else:
+        await update.message.reply_text("Nothing to cancel.")
+
 # ✅ PROCESS NUMBERS
-async def process_numbers(update, context, numbers):
+async def process_numbers(update, context, numbers, file_base=None, progress=None, prepared=False):
     user_id = update.effective_user.id
-    contact_name = user_contact_names.get(user_id, default_contact_name)
-    file_base = user_file_names.get(user_id, default_vcf_name)
-    limit = user_limits.get(user_id, default_limit)
-    start_index = user_start_indexes.get(user_id, None)
-    vcf_num = user_vcf_start_numbers.get(user_id, None)
-    country_code = user_country_codes.get(user_id, "")
-    custom_group_start = user_group_start_numbers.get(user_id, None)
-
-    numbers = list(dict.fromkeys([n.strip() for n in numbers if n.strip().isdigit()]))
-    chunks = [numbers[i:i+limit] for i in range(0, len(numbers), limit)]
-
-    for idx, chunk in enumerate(chunks):
-        group_num = (custom_group_start + idx) if custom_group_start else None
-        file_suffix = f"{vcf_num+idx}" if vcf_num else f"{idx+1}"
-        file_path = generate_vcf(
-            chunk,
-            f"{file_base}_{file_suffix}",
-            contact_name,
-            (start_index + idx*limit) if start_index else None,
-            country_code,
-            group_num
-        )
-        await update.message.reply_document(document=open(file_path, "rb"))
-        os.remove(file_path)
+    settings = settings_store.get(user_id)
+    contact_name = settings.contact_name
+    file_base = file_base or settings.file_name
+    limit = settings.limit or default_limit
+    start_index = settings.start_index
+    vcf_num = settings.vcf_start
+    country_code = settings.country_code
+    custom_group_start = settings.group_start
+    zip_mode = settings.zip_mode
+
+    # numbers may be any iterable (list, Series, generator); it is consumed lazily, on the render thread.
+    # prepared: already normalized, country code stripped and unique (upload or merge output), only chunked
+    def vcf_chunks():
+        unique = numbers if prepared else iter_unique(iter_normalized(numbers, country_code))
+        for idx, chunk in enumerate(iter_chunks(unique, limit)):
+            group_num = (custom_group_start + idx) if custom_group_start else None
+            file_suffix = f"{vcf_num+idx}" if vcf_num else f"{idx+1}"
+            yield f"{file_base}_{file_suffix}", (
+                chunk,
+                contact_name,
+                (start_index + idx*limit) if start_index else None,
+                country_code,
+                group_num
+            )
+
+    chunks = vcf_chunks()
+    bundle = zip_mode == "on"
+    if zip_mode == "auto":
+        if prepared and hasattr(numbers, "__len__"):
+            bundle = -(-len(numbers) // limit) > ZIP_AUTO_CHUNKS
+        else:
+            # peeking runs the normalize/de-dup pipeline: on a worker thread, like the rest of it
+            async with cpu_slots.held():
+                head = await asyncio.get_running_loop().run_in_executor(
+                    None, list, islice(chunks, ZIP_AUTO_CHUNKS + 1))
+            bundle = len(head) > ZIP_AUTO_CHUNKS
+            chunks = chain(head, chunks)
+
+    if progress is not None:
+        progress.stage = "Rendering and uploading…"
+        if hasattr(numbers, "__len__"):
+            progress.parsed = len(numbers)
+        if progress.parsed:
+            progress.files = None if bundle else -(-progress.parsed // limit)
+
+    if bundle:
+        # parts run up to ZIP_PART_MAX_BYTES each: render one ahead, not a whole window of them
+        return await uploader.send_documents(update.message, iter_vcf_zips(chunks, file_base), progress, window=1)
+    return await uploader.send_documents(
+        update.message,
+        (generate_vcf(chunk, name, *args) for name, (chunk, *args) in chunks),
+        progress
+    )
+
 
 # ✅ SETTINGS COMMANDS
 async def set_filename(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args:
-        user_file_names[update.effective_user.id] = ' '.join(context.args)
+        settings_store.update(update.effective_user.id, file_name=' '.join(context.args))
         await update.message.reply_text(f"✅ File name set to: {' '.join(context.args)}")
 
 async def set_contact_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args:
-        user_contact_names[update.effective_user.id] = ' '.join(context.args)
+        settings_store.update(update.effective_user.id, contact_name=' '.join(context.args))
         await update.message.reply_text(f"✅ Contact name set to: {' '.join(context.args)}")
 
 async def set_limit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and context.args[0].isdigit():
-        user_limits[update.effective_user.id] = int(context.args[0])
+        settings_store.update(update.effective_user.id, limit=int(context.args[0]))
         await update.message.reply_text(f"✅ Limit set to: {context.args[0]}")
 
 async def set_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and context.args[0].isdigit():
-        user_start_indexes[update.effective_user.id] = int(context.args[0])
+        settings_store.update(update.effective_user.id, start_index=int(context.args[0]))
         await update.message.reply_text(f"✅ Contact numbering will start from: {context.args[0]}")
 
 async def set_vcf_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and context.args[0].isdigit():
-        user_vcf_start_numbers[update.effective_user.id] = int(context.args[0])
+        settings_store.update(update.effective_user.id, vcf_start=int(context.args[0]))
         await update.message.reply_text(f"✅ VCF numbering will start from: {context.args[0]}")
 
 async def set_country_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args:
-        user_country_codes[update.effective_user.id] = context.args[0]
+        settings_store.update(update.effective_user.id, country_code=context.args[0])
         await update.message.reply_text(f"✅ Country code set to: {context.args[0]}")
 
 async def set_group_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and context.args[0].isdigit():
-        user_group_start_numbers[update.effective_user.id] = int(context.args[0])
+        settings_store.update(update.effective_user.id, group_start=int(context.args[0]))
         await update.message.reply_text(f"✅ Group numbering will start from: {context.args[0]}")
 
+async def set_zip_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if context.args and context.args[0].lower() in ("on", "off", "auto"):
+        settings_store.update(update.effective_user.id, zip_mode=context.args[0].lower())
+        await update.message.reply_text(f"✅ ZIP bundle mode set to: {context.args[0].lower()}")
+    else:
+        await update.message.reply_text("Usage: /setzip on | off | auto")
+
 async def reset_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_file_names.pop(user_id, None)
-    user_contact_names.pop(user_id, None)
-    user_limits.pop(user_id, None)
-    user_start_indexes.pop(user_id, None)
-    user_vcf_start_numbers.pop(user_id, None)
-    user_country_codes.pop(user_id, None)
-    user_group_start_numbers.pop(user_id, None)
+    settings_store.reset(user_id)
     await update.message.reply_text("✅ All settings reset to default.")
 
 async def my_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
+    s = settings_store.get(user_id)
     settings = (
-        f"📂 File name: {user_file_names.get(user_id, default_vcf_name)}\n"
-        f"👤 Contact name: {user_contact_names.get(user_id, default_contact_name)}\n"
-        f"📊 Limit: {user_limits.get(user_id, default_limit)}\n"
-        f"🔢 Start index: {user_start_indexes.get(user_id, 'Not set')}\n"
-        f"📄 VCF start: {user_vcf_start_numbers.get(user_id, 'Not set')}\n"
-        f"🌍 Country code: {user_country_codes.get(user_id, 'None')}\n"
-        f"📑 Group start: {user_group_start_numbers.get(user_id, 'Not set')}"
+        f"📂 File name: {s.file_name}\n"
+        f"👤 Contact name: {s.contact_name}\n"
+        f"📊 Limit: {s.limit}\n"
+        f"🔢 Start index: {s.start_index if s.start_index is not None else 'Not set'}\n"
+        f"📄 VCF start: {s.vcf_start if s.vcf_start is not None else 'Not set'}\n"
+        f"🌍 Country code: {s.country_code or 'None'}\n"
+        f"📑 Group start: {s.group_start if s.group_start is not None else 'Not set'}\n"
+        f"🗜 ZIP mode: {s.zip_mode}"
     )
     await update.message.reply_text(settings)
 
@@ -319,18 +1518,20 @@ async def make_vcf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     contact_name = context.args[0]
-    numbers = context.args[1:]
-    
-    file_path = generate_vcf(numbers, contact_name, contact_name)
-    await update.message.reply_document(document=open(file_path, "rb"))
-    os.remove(file_path)
+    numbers = normalize_numbers(context.args[1:])
+    if not numbers:
+        await update.message.reply_text("No valid numbers found.")
+        return
+
+    await update.message.reply_document(document=generate_vcf(numbers, contact_name, contact_name))
 
 # ✅ MERGE
 async def merge_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    merge_data[user_id] = {"files": [], "filename": "Merged"}  # default
-    if context.args:
-        merge_data[user_id]["filename"] = "_".join(context.args)
+    expire_merge_sessions()
+    if user_id in merge_data:
+        close_merge_session(merge_data.pop(user_id))  # a new /merge starts over
+    merge_data[user_id] = new_merge_session("_".join(context.args) if context.args else "Merged")
     await update.message.reply_text(
         f"📂 Send me files to merge. Final file will be: {merge_data[user_id]['filename']}.vcf\n"
         "👉 When done, use /done."
@@ -338,32 +1539,60 @@ async def merge_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def done_merge(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if user_id not in merge_data or not merge_data[user_id]["files"]:
+    expire_merge_sessions()
+    if user_id not in merge_data:
         await update.message.reply_text("❌ No files queued for merge.")
         return
+    # files sent before /done are still ahead in the job queue; files sent after it start fresh
+    session = merge_data.pop(user_id)
+    if not await jobs.submit(update, context, partial(finish_merge, update, context, session)):
+        if merge_data.setdefault(user_id, session) is not session:
+            close_merge_session(session)
 
-    all_numbers = set()
-    for file_path in merge_data[user_id]["files"]:
-        if file_path.endswith(".vcf"):
-            all_numbers.update(extract_numbers_from_vcf(file_path))
-        elif file_path.endswith(".txt"):
-            all_numbers.update(extract_numbers_from_txt(file_path))
+async def finish_merge(update, context, session, progress):
+    user_id = update.effective_user.id
+    if not session["sources"]:
+        await update.message.reply_text("❌ No files queued for merge.")
+        return
 
-    filename = merge_data[user_id]["filename"]
-    vcf_path = generate_vcf(list(all_numbers), filename)
-    await update.message.reply_document(document=open(vcf_path, "rb"))
-    os.remove(vcf_path)
+    filename = session["filename"]
+    try:
+        async with cpu_slots.held(progress, "Merging…"):
+            path, total, stats = await converter.run(user_id, merge_sources, session["sources"], user_id,
+                                                     settings_store.get(user_id).country_code)
+    except ConversionBusy:
+        if merge_data.setdefault(user_id, session) is session:
+            session["touched"] = time.monotonic()
+            await update.message.reply_text("⏳ Bot is busy right now, send /done again in a minute.")
+            return
+        close_merge_session(session)  # a new /merge was started meanwhile
+        await update.message.reply_text("⏳ Bot is busy right now, the merge was dropped; start again with /merge.")
+        return
+    except BaseException:
+        close_merge_session(session)
+        raise
+    close_merge_session(session)
 
-    for file_path in merge_data[user_id]["files"]:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    merge_data.pop(user_id, None)
+    try:
+        if not total:
+            await update.message.reply_text("❌ No numbers found in the queued files.")
+            return
+        # same writer as a normal upload: honours /setlimit, contact name, country code and ZIP mode;
+        # the merged file is already normalized and unique, so it is only chunked, never held whole
+        progress.parsed = total
+        await process_numbers(update, context, iter_numbers_from_txt(path), file_base=filename, progress=progress,
+                              prepared=True)
+    finally:
+        os.remove(path)
 
-    await update.message.reply_text(f"✅ Merge completed → {filename}.vcf")
+    report = [f"✅ Merge completed → {filename} ({total} unique numbers)"]
+    for name, count, fresh in stats:
+        report.append(f"• {name}: {count} numbers, {fresh} new, {count - fresh} duplicates")
+    await update.message.reply_text("\n".join(report)[:4000])
 
 # ✅ MAIN
 if __name__ == "__main__":
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).request(telegram_request()).build()
 
     # Commands
     app.add_handler(CommandHandler("start", start))
@@ -374,6 +1603,7 @@ if __name__ == "__main__":
     app.add_handler(CommandHandler("setvcfstart", set_vcf_start))
     app.add_handler(CommandHandler("setcountrycode", set_country_code))
     app.add_handler(CommandHandler("setgroup", set_group_number))
+    app.add_handler(CommandHandler("setzip", set_zip_mode))
     app.add_handler(CommandHandler("reset", reset_settings))
     app.add_handler(CommandHandler("mysettings", my_settings))
     app.add_handler(CommandHandler("makevcf", make_vcf_command))
@@ -381,11 +1611,16 @@ if __name__ == "__main__":
     app.add_handler(CommandHandler("done", done_merge))
     app.add_handler(CommandHandler("txt2vcf", txt2vcf))
     app.add_handler(CommandHandler("vcf2txt", vcf2txt))
+    app.add_handler(CommandHandler("cancel", cancel_jobs))
 
     # Handlers
     app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     app.add_error_handler(error_handler)
 
+    clear_scratch()
     print("🚀 Bot is running...")
-    app.run_polling()
+    try:
+        app.run_polling()
+    finally:
+        converter.shutdown()
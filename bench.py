@@ -0,0 +1,306 @@
+"""Benchmarks for the conversion hot paths.
+
+Generates seeded TXT / CSV / XLSX / vCard corpora (with the messy formatting real
+uploads have), runs every stage in a fresh process and records wall time,
+throughput, peak RSS and tracemalloc peak. process_numbers runs end to end against
+a fake Telegram message, so no network or token is needed.
+
+    python bench.py                              # 1k .. 1M, all stages
+    python bench.py --sizes 10000000 --stages txt.extract,unique --no-alloc
+    python bench.py --compare bench_results/20260101T000000Z.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import asyncio
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Optional
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+DEFAULT_SEED = 1234
+DUPLICATE_RATE = 0.1  # share of entries repeating an earlier number
+
+# ============ SEEDED CORPORA ============
+def national_number(rng: random.Random) -> str:
+    return str(rng.randint(6, 9)) + "".join(str(rng.randint(0, 9)) for _ in range(9))
+
+def number_pool(rng: random.Random, size: int):
+    # yields `size` numbers, DUPLICATE_RATE of them repeats of recent ones
+    recent = []
+    for _ in range(size):
+        if recent and rng.random() < DUPLICATE_RATE:
+            yield rng.choice(recent)
+            continue
+        num = national_number(rng)
+        if len(recent) < 4096:
+            recent.append(num)
+        else:
+            recent[rng.randrange(4096)] = num
+        yield num
+
+def messy(rng: random.Random, num: str) -> str:
+    # the spellings users actually paste: country codes, trunk zeros, punctuation, spaces
+    r = rng.random()
+    if r < 0.4:
+        return num
+    if r < 0.55:
+        return f"+91{num}"
+    if r < 0.65:
+        return f"+91-{num[:5]}-{num[5:]}"
+    if r < 0.75:
+        return f"({num[:3]}) {num[3:6]}-{num[6:]}"
+    if r < 0.82:
+        return f"{num[:3]}.{num[3:6]}.{num[6:]}"
+    if r < 0.9:
+        return f"0{num}"
+    if r < 0.95:
+        return f"91{num}"
+    return f"{num[:5]} {num[5:]}"  # split by a space: two short runs, rejected by the scanner
+
+def write_txt(path: str, size: int, seed: int):
+    rng = random.Random(seed)
+    junk = ["call me at the office", "----", "", "Name: Rahul", "ok 123", "whatsapp only"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for num in number_pool(rng, size):
+            r = rng.random()
+            if r < 0.05:
+                f.write(rng.choice(junk) + "\n")
+            end = "\r\n" if rng.random() < 0.2 else "\n"
+            if r < 0.7:
+                f.write(messy(rng, num) + end)
+            elif r < 0.85:
+                f.write(f"Contact {rng.randint(1, 99999)}: {messy(rng, num)}{end}")
+            else:
+                f.write(f"{messy(rng, num)}, {end}")
+
+def write_csv(path: str, size: int, seed: int):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("name,phone,email,notes\n")
+        for i, num in enumerate(number_pool(rng, size)):
+            r = rng.random()
+            phone = f"{num}.0" if r < 0.1 else ("" if r < 0.13 else messy(rng, num))
+            notes = '"met at expo, hall 2"' if rng.random() < 0.1 else ""
+            f.write(f"Contact {i},{phone},user{i}@example.com,{notes}\n")
+
+def write_xlsx(path: str, size: int, seed: int):
+    import openpyxl
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Name", "Mobile", "City"])
+    for i, num in enumerate(number_pool(rng, size)):
+        r = rng.random()
+        phone = int(num) if r < 0.4 else (None if r < 0.43 else messy(rng, num))
+        ws.append([f"Contact {i}", phone, rng.choice(["Delhi", "Pune", "Surat", None])])
+    wb.save(path)
+
+def write_vcf(path: str, size: int, seed: int):
+    rng = random.Random(seed)
+    photo = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(1500))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for i, num in enumerate(number_pool(rng, size)):
+            r = rng.random()
+            if r < 0.2:
+                # vCard 2.1, quoted-printable value with a soft line break
+                f.write(f"BEGIN:VCARD\r\nVERSION:2.1\r\nN:;Contact {i};;;\r\n"
+                        f"TEL;CELL;ENCODING=QUOTED-PRINTABLE:{num[:5]}=\r\n{num[5:]}\r\nEND:VCARD\r\n")
+            elif r < 0.3:
+                # grouped property, value folded onto a continuation line
+                f.write(f"BEGIN:VCARD\nVERSION:3.0\nFN:Contact {i}\n"
+                        f"item1.TEL;TYPE=CELL:+91 {num[:4]}\n {num[4:]}\nitem1.X-ABLabel:mobile\nEND:VCARD\n")
+            elif r < 0.32:
+                # embedded photo: a long base64 blob the tokenizer must skip
+                blob = "\n ".join(photo[j:j + 74] for j in range(0, len(photo), 74))
+                f.write(f"BEGIN:VCARD\nVERSION:3.0\nFN:Contact {i}\nPHOTO;ENCODING=b;TYPE=JPEG:{blob}\n"
+                        f"TEL;TYPE=CELL:{messy(rng, num)}\nEND:VCARD\n")
+            else:
+                f.write(f"BEGIN:VCARD\nVERSION:3.0\nFN:Contact {i}\nTEL;TYPE=CELL:{messy(rng, num)}\nEND:VCARD\n")
+
+WRITERS = {"txt": write_txt, "csv": write_csv, "xlsx": write_xlsx, "vcf": write_vcf}
+
+def corpus(kind: str, size: int, seed: int, corpus_dir: str) -> str:
+    # generated once per (kind, size, seed) and reused by later runs
+    path = os.path.join(corpus_dir, f"{kind}_{size}_{seed}.{kind}")
+    if not os.path.exists(path):
+        tmp = path + ".part"
+        WRITERS[kind](tmp, size, seed)
+        os.replace(tmp, path)
+    return path
+
+def messy_values(size: int, seed: int):
+    rng = random.Random(seed)
+    return [messy(rng, num) for num in number_pool(rng, size)]
+
+# ============ FAKE TELEGRAM ============
+class FakeMessage:
+    # stands in for telegram.Message: counts what would have been uploaded
+    chat_id = 1
+
+    def __init__(self):
+        self.documents = 0
+        self.bytes_out = 0
+
+    async def reply_document(self, document=None, **kwargs):
+        self.documents += 1
+        self.bytes_out += len(document.input_file_content)
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"fake-{self.documents}"))
+
+    async def reply_text(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        return self
+
+def fake_update(message: FakeMessage):
+    user = SimpleNamespace(id=1, username="bench")
+    return SimpleNamespace(effective_user=user, effective_chat=SimpleNamespace(id=1), message=message)
+
+# ============ STAGES ============
+# name -> (input kind, function). File stages get a corpus path, the rest a list of values.
+def stage_process_numbers(numbers):
+    import NIKALLLLLLL as bot
+    message = FakeMessage()
+    asyncio.run(bot.process_numbers(fake_update(message), None, numbers))
+    return {"documents": message.documents, "bytes_out": message.bytes_out}
+
+def _stages():
+    import NIKALLLLLLL as bot
+    return {
+        "txt.extract": ("txt", bot.extract_numbers_from_txt),
+        "vcf.extract": ("vcf", bot.extract_numbers_from_vcf),
+        "csv.parse": ("csv", lambda path: list(bot.iter_numbers_from_csv(path))),
+        "xlsx.parse": ("xlsx", lambda path: list(bot.iter_numbers_from_xlsx(path))),
+        "normalize": ("values", lambda values: list(bot.iter_normalized(values))),
+        "unique": ("numbers", lambda numbers: list(bot.iter_unique(numbers))),
+        "generate_vcf": ("numbers", lambda numbers: bot.generate_vcf(numbers, "Bench")),
+        "process_numbers": ("numbers", stage_process_numbers),
+    }
+
+STAGE_NAMES = ("txt.extract", "vcf.extract", "csv.parse", "xlsx.parse",
+               "normalize", "unique", "generate_vcf", "process_numbers")
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def run_stage(stage: str, size: int, seed: int, corpus_dir: str, trace: bool) -> dict:
+    # runs in a fresh spawned process, so ru_maxrss belongs to this stage alone
+    kind, fn = _stages()[stage]
+    bytes_in = None
+    if kind in WRITERS:
+        arg = corpus(kind, size, seed, corpus_dir)
+        bytes_in = os.path.getsize(arg)
+    elif kind == "values":
+        arg = messy_values(size, seed)
+    else:
+        import NIKALLLLLLL as bot
+        arg = bot.normalize_numbers(messy_values(size, seed))
+    rss_before = peak_rss_mb()
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    out = fn(arg)
+    seconds = time.perf_counter() - started
+    result = {"stage": stage, "size": size, "seconds": round(seconds, 4),
+              "numbers_per_s": round(size / seconds) if seconds else None,
+              "peak_rss_mb": round(peak_rss_mb(), 1),
+              "rss_growth_mb": round(max(0.0, peak_rss_mb() - rss_before), 1)}
+    if trace:
+        result["alloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024**2), 1)
+        tracemalloc.stop()
+    if bytes_in is not None:
+        result["bytes_in"] = bytes_in
+        result["mb_per_s"] = round(bytes_in / (1024**2) / seconds, 1) if seconds else None
+    if isinstance(out, dict):
+        result.update(out)
+    elif hasattr(out, "input_file_content"):
+        result["bytes_out"] = len(out.input_file_content)
+    elif hasattr(out, "__len__"):
+        result["output_count"] = len(out)
+    return result
+
+def isolated(stage: str, size: int, seed: int, corpus_dir: str, trace: bool) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_stage, stage, size, seed, corpus_dir, trace).result()
+
+# ============ REPORT ============
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {(r["stage"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["stage"], r["size"]))
+        if old and old.get("seconds"):
+            ratio = r["seconds"] / old["seconds"]
+            flag = "  <-- slower" if ratio > 1.1 else ""
+            print(f"  {r['stage']:<16}{r['size']:>10}  {old['seconds']:>9.3f}s -> {r['seconds']:>9.3f}s  x{ratio:.2f}{flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the VCF bot's conversion hot paths.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated corpus sizes (numbers)")
+    parser.add_argument("--stages", default=",".join(STAGE_NAMES), help="comma-separated stages to run")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "vcfbot-bench"))
+    parser.add_argument("--out-dir", default="bench_results")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass (slow on big sizes)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGE_NAMES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # inherited by the stage processes before they import the bot: no rate limits,
+    # no pool inside the pool, and a throwaway settings DB
+    os.environ.update({
+        "SETTINGS_DB": os.path.join(args.corpus_dir, "bench_settings.db"),
+        "CONVERT_EXECUTOR": "thread",
+        "UPLOAD_CHAT_RATE": "1e9", "UPLOAD_CHAT_BURST": "1000000000", "UPLOAD_GLOBAL_RATE": "1e9",
+    })
+
+    results = []
+    for size in sizes:
+        for stage in stages:
+            result = isolated(stage, size, args.seed, args.corpus_dir, trace=False)
+            if not args.no_alloc:
+                result["alloc_peak_mb"] = isolated(stage, size, args.seed, args.corpus_dir, trace=True)["alloc_peak_mb"]
+            results.append(result)
+            print(f"{stage:<16}{size:>10}  {result['seconds']:>9.3f}s  {result['numbers_per_s'] or 0:>12,}/s"
+                  f"  rss {result['peak_rss_mb']:>8.1f} MB  alloc {result.get('alloc_peak_mb', '-'):>8} MB", flush=True)
+
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    report = {
+        "meta": {"timestamp": stamp, "git_rev": git_rev(), "seed": args.seed, "python": sys.version.split()[0],
+                 "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "results": results,
+    }
+    out_path = os.path.join(args.out_dir, f"{stamp}.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults -> {out_path}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
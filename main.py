@@ -2,17 +2,29 @@ import os
 import io
 import sys
 import time
+import queue
+import atexit
 import threading
 import traceback
 import sqlite3
 import datetime
+import json
+import hmac
+import secrets
+import gzip
+import hashlib
+import shutil
+import asyncio
+import urllib.request
+from collections import Counter, deque
 from typing import Optional, List, Tuple
 
 # ------------- Replace with your actual bot logic module (must be present) -------------
 import NIKALLLLLLL
+import metrics
 
-from flask import Flask, render_template_string, request, jsonify, send_file
-from telegram import Bot, InputFile
+from flask import Flask, Response, request, jsonify, send_file
+from telegram import Bot, InputFile, Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
 # ============ UPTIME (single source) ============
@@ -34,57 +46,474 @@ def uptime_seconds():
 # ============ ENV / CONFIG ============
 BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
 APP_PORT = int(os.environ.get("PORT", "8080"))
+# Webhook mode: with DASHBOARD_MODE=embedded updates arrive on the dashboard's uvicorn server (same port);
+# with DASHBOARD_MODE=external the bot runs PTB's own webhook server on WEBHOOK_PORT, and WEBHOOK_URL
+# must route WEBHOOK_PATH there (the dashboard port belongs to gunicorn)
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip("/")  # public base URL; set to switch from polling to webhook
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))   # external mode only
+# every webhook call must carry this; without one configured a random secret is made per run and
+# registered with set_webhook, so forged updates are always refused
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+CONCURRENT_UPDATES = int(os.environ.get("CONCURRENT_UPDATES", "16"))  # 0 = process updates one by one
+WEBHOOK_MAX_CONNECTIONS = min(max(CONCURRENT_UPDATES, 40), 100)       # Telegram accepts 1-100
+# embedded (default): uvicorn serves the dashboard from a thread in the bot process, sharing its DB, logs
+# and metrics. external: `python main.py dashboard` runs gunicorn separately; it reads bot_stats.db and
+# bot_errors.log from disk, so both processes must share a host and working dir (honcho, not split containers)
+DASHBOARD_MODE = os.environ.get("DASHBOARD_MODE", "embedded")
+# the bot's own metrics listener (0 = off). Needed with DASHBOARD_MODE=external, where the gunicorn
+# workers hold empty registries of their own; the dashboard's /metrics then relays this port
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+DASHBOARD_WORKERS = int(os.environ.get("DASHBOARD_WORKERS", "2"))
+DASHBOARD_THREADS = int(os.environ.get("DASHBOARD_THREADS", "16"))  # gthread: SSE clients each hold a thread
 DB_FILE = os.environ.get("DB_FILE", "bot_stats.db")
 ERROR_LOG = os.environ.get("ERROR_LOG", "bot_errors.log")
+ERROR_LOG_MAX_BYTES = int(os.environ.get("ERROR_LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # rotate past this size
+ERROR_LOG_BACKUPS = int(os.environ.get("ERROR_LOG_BACKUPS", "5"))                         # bot_errors.log.N.gz kept
+LOG_FLUSH_ROWS = int(os.environ.get("LOG_FLUSH_ROWS", "200"))           # write a batch once this many rows queue up
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "1.0"))  # ... or once the oldest row is this old (s)
+SAMPLE_INTERVAL = float(os.environ.get("SAMPLE_INTERVAL", "5"))   # seconds between system samples
+SAMPLE_HISTORY = int(os.environ.get("SAMPLE_HISTORY", "720"))      # samples kept (1h at 5s)
+STREAM_TICK = float(os.environ.get("STREAM_TICK", "2.0"))                # seconds between live-feed snapshots
+STREAM_MAX_AGE = float(os.environ.get("STREAM_MAX_AGE", "300"))          # end a live feed after this; EventSource reconnects
 
 # ============ DB (minimal) ============
-def init_db():
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS actions (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        username TEXT,
+        action_id INTEGER NOT NULL REFERENCES actions(id),
+        ts INTEGER NOT NULL
+    )""",
+    # (ts, action_id, user_id) also covers the chart / hourly range scans without touching the table
+    "CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(ts, action_id, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_action_ts ON logs(action_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_user ON logs(user_id)",
+]
+# Rollups are kept in step with logs by the log writer (same transaction) and backfilled once
+ROLLUP_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS rollup_hourly (
+        hour INTEGER NOT NULL,              -- epoch of the local-time hour start
+        action_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (hour, action_id)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_daily_users (
+        day TEXT NOT NULL,                  -- local date, YYYY-MM-DD
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (day, user_id)
+    ) WITHOUT ROWID""",
+    "CREATE TABLE IF NOT EXISTS rollup_users (user_id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS rollup_action_totals (action_id INTEGER PRIMARY KEY, count INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS rollup_meta (key TEXT PRIMARY KEY, value INTEGER)",
+]
+MIGRATE_BATCH = int(os.environ.get("MIGRATE_BATCH", "50000"))
+
+def _columns(c, table: str) -> List[str]:
+    return [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+
+def prepare_legacy_logs(conn) -> bool:
+    # Old schema: logs(id, user_id, username, action TEXT, timestamp TEXT local time).
+    # Only the cheap part runs at startup: the table is renamed to logs_legacy, the new logs
+    # table's id sequence is moved past the legacy ids (so rows logged meanwhile never collide
+    # with copied ones) and the rollups are switched to incremental upkeep. The copy itself is
+    # migrate_legacy_logs, run in the background. -> True if a copy is pending.
+    c = conn.cursor()
+    if "timestamp" in _columns(c, "logs"):
+        c.execute("ALTER TABLE logs RENAME TO logs_legacy")
+    if not _columns(c, "logs_legacy"):
+        conn.commit()
+        return False
+    for stmt in SCHEMA + ROLLUP_SCHEMA:
+        c.execute(stmt)
+    if not c.execute("SELECT 1 FROM rollup_meta WHERE key = 'migrate_last_id'").fetchone():
+        # first start on this DB, or one left mid-copy by the old synchronous migration (which ran
+        # before any live writes): start the copy over
+        c.execute("DELETE FROM logs")
+        for stmt in ("DELETE FROM rollup_hourly", "DELETE FROM rollup_daily_users",
+                     "DELETE FROM rollup_users", "DELETE FROM rollup_action_totals"):
+            c.execute(stmt)
+        max_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM logs_legacy").fetchone()[0]
+        c.execute("DELETE FROM sqlite_sequence WHERE name = 'logs'")
+        c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('logs', ?)", (max_id,))
+        c.executemany("INSERT OR REPLACE INTO rollup_meta (key, value) VALUES (?, ?)",
+                      [("migrate_last_id", 0), ("migrate_max_id", max_id), ("backfilled", 0)])
+    conn.commit()
+    return True
+
+def migrate_legacy_logs():
+    # Copies logs_legacy into logs in id-ranged batches, each its own short transaction that also
+    # adds the batch to the rollups, so the action log writer and dashboard reads interleave with
+    # it. Progress lives in rollup_meta, so a restart resumes where it stopped.
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    try:
+        c = conn.cursor()
+        if not _columns(c, "logs_legacy"):
+            return
+        c.execute("INSERT OR IGNORE INTO actions (name) SELECT DISTINCT COALESCE(action, '') FROM logs_legacy")
+        conn.commit()
+        local_hour = "CAST(strftime('%s', strftime('%Y-%m-%d %H:00:00', ts, 'unixepoch', 'localtime'), 'utc') AS INTEGER)"
+        batch = "FROM logs WHERE id > ? AND id <= ?"
+        last_id = c.execute("SELECT value FROM rollup_meta WHERE key = 'migrate_last_id'").fetchone()[0]
+        max_id = c.execute("SELECT value FROM rollup_meta WHERE key = 'migrate_max_id'").fetchone()[0]
+        while last_id < max_id:
+            hi = min(last_id + MIGRATE_BATCH, max_id)
+            c.execute("""
+                INSERT INTO logs (id, user_id, username, action_id, ts)
+                SELECT l.id, l.user_id, l.username, a.id,
+                       COALESCE(CAST(strftime('%s', l.timestamp, 'utc') AS INTEGER), 0)
+                FROM logs_legacy l JOIN actions a ON a.name = COALESCE(l.action, '')
+                WHERE l.id > ? AND l.id <= ?
+            """, (last_id, hi))
+            c.execute(f"""INSERT INTO rollup_hourly (hour, action_id, count)
+                          SELECT {local_hour} AS h, action_id, COUNT(*) {batch} GROUP BY h, action_id
+                          ON CONFLICT(hour, action_id) DO UPDATE SET count = count + excluded.count""", (last_id, hi))
+            c.execute(f"""INSERT INTO rollup_action_totals (action_id, count)
+                          SELECT action_id, COUNT(*) {batch} GROUP BY action_id
+                          ON CONFLICT(action_id) DO UPDATE SET count = count + excluded.count""", (last_id, hi))
+            c.execute(f"""INSERT OR IGNORE INTO rollup_daily_users (day, user_id)
+                          SELECT DISTINCT date(ts, 'unixepoch', 'localtime'), user_id {batch}""", (last_id, hi))
+            c.execute(f"INSERT OR IGNORE INTO rollup_users (user_id) SELECT DISTINCT user_id {batch}", (last_id, hi))
+            c.execute("UPDATE rollup_meta SET value = ? WHERE key = 'migrate_last_id'", (hi,))
+            conn.commit()
+            last_id = hi
+        c.execute("DROP TABLE logs_legacy")
+        c.execute("DELETE FROM rollup_meta WHERE key IN ('migrate_last_id', 'migrate_max_id')")
+        conn.commit()
+    except Exception as e:
+        # left as is: the next start resumes from the last committed batch
+        write_error_log(f"{datetime.datetime.utcnow()} - Legacy log migration stopped: {e}\n")
+    finally:
+        conn.close()
+
+def migration_progress(c) -> Optional[float]:
+    # percent of legacy rows copied while the background migration runs, else None
+    meta = dict(c.execute("SELECT key, value FROM rollup_meta WHERE key IN ('migrate_last_id', 'migrate_max_id')"))
+    if len(meta) < 2:
+        return None
+    return round(100.0 * meta["migrate_last_id"] / max(meta["migrate_max_id"], 1), 1)
+
+def backfill_rollups(conn):
+    c = conn.cursor()
+    if c.execute("SELECT 1 FROM rollup_meta WHERE key = 'backfilled'").fetchone():
+        return
+    local_hour = "CAST(strftime('%s', strftime('%Y-%m-%d %H:00:00', ts, 'unixepoch', 'localtime'), 'utc') AS INTEGER)"
+    c.execute("DELETE FROM rollup_hourly")
+    c.execute("DELETE FROM rollup_daily_users")
+    c.execute("DELETE FROM rollup_users")
+    c.execute("DELETE FROM rollup_action_totals")
+    c.execute(f"INSERT INTO rollup_hourly SELECT {local_hour} AS h, action_id, COUNT(*) FROM logs GROUP BY h, action_id")
+    c.execute("""INSERT OR IGNORE INTO rollup_daily_users
+                 SELECT DISTINCT date(ts, 'unixepoch', 'localtime'), user_id FROM logs""")
+    c.execute("INSERT OR IGNORE INTO rollup_users SELECT DISTINCT user_id FROM logs")
+    c.execute("INSERT INTO rollup_action_totals SELECT action_id, COUNT(*) FROM logs GROUP BY action_id")
+    c.execute("INSERT INTO rollup_meta (key, value) VALUES ('backfilled', (SELECT COALESCE(MAX(id), 0) FROM logs))")
+    conn.commit()
+
+def update_rollups(conn, rows):
+    # rows: (user_id, username, action_id, ts) just inserted into logs; caller commits
+    hourly = Counter()
+    totals = Counter()
+    days = set()
+    for uid, _, action_id, ts in rows:
+        local = datetime.datetime.fromtimestamp(ts)
+        hourly[(int(time.mktime(local.replace(minute=0, second=0).timetuple())), action_id)] += 1
+        totals[action_id] += 1
+        days.add((local.strftime('%Y-%m-%d'), uid))
+    conn.executemany("""INSERT INTO rollup_hourly (hour, action_id, count) VALUES (?, ?, ?)
+                        ON CONFLICT(hour, action_id) DO UPDATE SET count = count + excluded.count""",
+                     [(h, a, n) for (h, a), n in hourly.items()])
+    conn.executemany("""INSERT INTO rollup_action_totals (action_id, count) VALUES (?, ?)
+                        ON CONFLICT(action_id) DO UPDATE SET count = count + excluded.count""",
+                     list(totals.items()))
+    conn.executemany("INSERT OR IGNORE INTO rollup_daily_users (day, user_id) VALUES (?, ?)", list(days))
+    conn.executemany("INSERT OR IGNORE INTO rollup_users (user_id) VALUES (?)", [(uid,) for _, uid in days])
+
+def init_db() -> bool:
+    # -> True if old logs still have to be copied: start_legacy_migration() once the bot is up
     with sqlite3.connect(DB_FILE) as conn:
         c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            username TEXT,
-            action TEXT,
-            timestamp TEXT
-        )''')
+        c.execute("PRAGMA journal_mode=WAL").fetchone()  # persistent; lets dashboard reads run alongside the log writer
+        pending = prepare_legacy_logs(conn)
+        for stmt in SCHEMA + ROLLUP_SCHEMA:
+            c.execute(stmt)
         conn.commit()
+        if not pending:
+            backfill_rollups(conn)
+    return pending
+
+def start_legacy_migration():
+    threading.Thread(target=migrate_legacy_logs, name="legacy-migration", daemon=True).start()
+
+def fmt_ts(ts: int) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+def day_start_ts(day: datetime.date) -> int:
+    return int(time.mktime(day.timetuple()))
+
+class ActionLogWriter:
+    # Handlers only enqueue; one thread owns a single long-lived connection and
+    # writes rows with executemany, flushing by batch size or age.
+    _STOP = object()
+
+    def __init__(self, db_file, flush_rows=LOG_FLUSH_ROWS, flush_interval=LOG_FLUSH_INTERVAL):
+        self.db_file = db_file
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.action_ids = {}
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="action-log", daemon=True)
+                self.thread.start()
+
+    def log(self, row):
+        self.start()
+        self.queue.put(row)
+
+    def flush(self, timeout: float = 5.0):
+        # blocks until everything queued before this call is committed
+        if self.thread is None or not self.thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.queue.put(self._STOP)
+        self.thread.join(timeout)
+
+    def _action_id(self, conn, name: str) -> int:
+        action_id = self.action_ids.get(name)
+        if action_id is None:
+            # committed on its own (before any of the batch's rows are written), so a batch that
+            # rolls back can't leave a cached id pointing at an action that was never stored
+            conn.execute("INSERT OR IGNORE INTO actions (name) VALUES (?)", (name,))
+            action_id = conn.execute("SELECT id FROM actions WHERE name = ?", (name,)).fetchone()[0]
+            conn.commit()
+            self.action_ids[name] = action_id
+        return action_id
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        try:
+            rows = [(uid, uname, self._action_id(conn, action), ts) for uid, uname, action, ts in batch]
+            conn.executemany("INSERT INTO logs (user_id, username, action_id, ts) VALUES (?, ?, ?, ?)", rows)
+            update_rollups(conn, rows)
+            conn.commit()
+        except Exception:
+            # swallowing DB errors to not crash bot
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self.action_ids.clear()  # re-read from the table next time
+        batch.clear()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except Exception:
+            pass
+        batch = []
+        deadline = None
+        while True:
+            try:
+                timeout = None if not batch else max(0.0, deadline - time.monotonic())
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write(conn, batch)
+                continue
+            if item is self._STOP:
+                self._write(conn, batch)
+                conn.close()
+                return
+            if isinstance(item, threading.Event):
+                self._write(conn, batch)
+                item.set()
+                continue
+            batch.append(item)
+            if len(batch) == 1:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.flush_rows:
+                self._write(conn, batch)
+
+action_log = ActionLogWriter(DB_FILE)
+atexit.register(action_log.close)
 
 def log_action(user_id: int, username: Optional[str], action: str):
-    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    action_log.log((user_id, username or 'N/A', action, int(time.time())))
+
+# ============ ERROR LOG ============
+_error_log_lock = threading.Lock()
+_tail_cache = {}  # (path, n) -> (size, mtime_ns, lines)
+
+def rotate_error_log():
+    # bot_errors.log -> bot_errors.log.1.gz, .1.gz -> .2.gz, ... oldest beyond ERROR_LOG_BACKUPS is dropped
+    for i in range(ERROR_LOG_BACKUPS - 1, 0, -1):
+        src = f"{ERROR_LOG}.{i}.gz"
+        if os.path.exists(src):
+            os.replace(src, f"{ERROR_LOG}.{i + 1}.gz")
+    if ERROR_LOG_BACKUPS > 0:
+        with open(ERROR_LOG, "rb") as src, gzip.open(f"{ERROR_LOG}.1.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    open(ERROR_LOG, "w").close()
+
+def write_error_log(text: str):
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute("INSERT INTO logs (user_id, username, action, timestamp) VALUES (?, ?, ?, ?)",
-                      (user_id, username or 'N/A', action, now))
-            conn.commit()
+        with _error_log_lock:
+            if os.path.exists(ERROR_LOG) and os.path.getsize(ERROR_LOG) >= ERROR_LOG_MAX_BYTES:
+                rotate_error_log()
+            with open(ERROR_LOG, "a", encoding="utf-8") as f:
+                f.write(text)
     except Exception:
-        # swallowing DB errors to not crash bot
         pass
 
+def tail_lines(path: str, n: int, block_size: int = 8192) -> List[str]:
+    # reads backwards from EOF one block at a time until n full lines are in hand
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return [line.decode("utf-8", errors="ignore") for line in data.splitlines(keepends=True)[-n:]]
+
+def errors_tail_lines(n: int = 200) -> List[str]:
+    try:
+        st = os.stat(ERROR_LOG)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        return [f"(error reading log: {e})"]
+    cached = _tail_cache.get((ERROR_LOG, n))
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    try:
+        lines = tail_lines(ERROR_LOG, n)
+    except Exception as e:
+        return [f"(error reading log: {e})"]
+    _tail_cache[(ERROR_LOG, n)] = (st.st_size, st.st_mtime_ns, lines)
+    return lines
+
 # ============ Import handlers from NIKALLLLLLL (user's bot logic) ============
 # Ensure NIKALLLLLLL provides the functions and constants below
 from NIKALLLLLLL import (
     start, set_filename, set_contact_name, set_limit, set_start,
-    set_vcf_start, set_country_code, set_group_number,
-    make_vcf_command, merge_command, done_merge,
+    set_vcf_start, set_country_code, set_group_number, set_zip_mode,
+    make_vcf_command, merge_command, done_merge, cancel_jobs,
     handle_document, handle_text, OWNER_ID, ALLOWED_USERS, reset_settings, my_settings,txt2vcf, vcf2txt
 )
 
+# ============ METRICS ============
+HANDLER_SECONDS = metrics.Histogram("vcfbot_handler_seconds", "Command handler latency.", ("handler",))
+LOOP_LAG = metrics.Gauge("vcfbot_event_loop_lag_seconds", "How late the bot's event loop wakes from a timed sleep.").labels()
+QUEUE_DEPTH = metrics.Gauge("vcfbot_queue_depth", "Items waiting in internal queues.", ("queue",))
+QUEUE_DEPTH.labels("jobs_waiting").set_function(lambda: sum(len(q) for q in list(NIKALLLLLLL.jobs.queues.values())))
+QUEUE_DEPTH.labels("jobs_running").set_function(lambda: len(NIKALLLLLLL.jobs.running))
+QUEUE_DEPTH.labels("conversions").set_function(lambda: NIKALLLLLLL.converter.queued)
+QUEUE_DEPTH.labels("action_log").set_function(lambda: action_log.queue.qsize())
+
+# ============ SYSTEM SAMPLER ============
+class SystemSampler:
+    # Samples host/process metrics on a fixed interval into a ring buffer, so
+    # request handlers never block on psutil (cpu_percent(interval=...) sleeps).
+    def __init__(self, interval: float = SAMPLE_INTERVAL, history: int = SAMPLE_HISTORY):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.loop_lag_ms: Optional[float] = None  # written by the bot's event loop probe
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        try:
+            import psutil
+        except Exception:
+            return
+        proc = psutil.Process()
+        # sample first, then sleep, so /api/stats has values right after startup; the first CPU
+        # reading blocks briefly (a non-blocking first reading is always 0.0), later ones span the interval
+        blocking = 0.1
+        while True:
+            sample = {"ts": int(time.time()), "cpu": None, "ram": None, "disk_free_gb": None,
+                      "rss_mb": None, "fds": None, "loop_lag_ms": self.loop_lag_ms}
+            try:
+                sample["cpu"] = round(psutil.cpu_percent(interval=blocking), 1)
+                blocking = None
+                sample["ram"] = round(psutil.virtual_memory().percent, 1)
+                sample["disk_free_gb"] = round(psutil.disk_usage("/").free / (1024**3), 1)
+                sample["rss_mb"] = round(proc.memory_info().rss / (1024**2), 1)
+                sample["fds"] = proc.num_fds() if hasattr(proc, "num_fds") else None
+            except Exception:
+                pass
+            self.samples.append(sample)
+            time.sleep(self.interval)
+
+    def latest(self) -> Optional[dict]:
+        self.start()
+        return self.samples[-1] if self.samples else None
+
+    def history(self, limit: int) -> List[dict]:
+        self.start()
+        return list(self.samples)[-limit:]
+
+system_sampler = SystemSampler()
+
+async def probe_loop_lag(interval: float = 1.0):
+    # how late the event loop wakes up from a timed sleep = time other callbacks hogged it
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        system_sampler.loop_lag_ms = round(lag * 1000, 1)
+        LOOP_LAG.set(lag)
+
+async def on_startup(app) -> None:
+    asyncio.get_running_loop().create_task(probe_loop_lag())
+
 # ============ TELEGRAM BOT SETUP ============
 if not BOT_TOKEN:
     print("WARNING: BOT_TOKEN not set. Telegram bot will not start. Set BOT_TOKEN env to run bot.")
-application = Application.builder().token(BOT_TOKEN).build() if BOT_TOKEN else None
+application = (
+    Application.builder()
+    .token(BOT_TOKEN)
+    .request(NIKALLLLLLL.telegram_request())
+    .concurrent_updates(CONCURRENT_UPDATES if CONCURRENT_UPDATES > 0 else False)
+    .post_init(on_startup)
+    .build()
+) if BOT_TOKEN else None
+webhook_loop: Optional[asyncio.AbstractEventLoop] = None  # bot's loop while running in webhook mode
+if application:
+    QUEUE_DEPTH.labels("updates").set_function(lambda: application.update_queue.qsize())
 tg_bot = Bot(BOT_TOKEN) if BOT_TOKEN else None
 
 # error handler -> file + DM owner (if OWNER_ID set)
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     error_text = "".join(traceback.format_exception(None, context.error, context.error.__traceback__))
-    try:
-        with open(ERROR_LOG, "a", encoding="utf-8") as f:
-            f.write(f"{datetime.datetime.utcnow()} - {error_text}\n\n")
-    except Exception:
-        pass
+    write_error_log(f"{datetime.datetime.utcnow()} - {error_text}\n\n")
     try:
         if OWNER_ID:
             await context.bot.send_message(chat_id=OWNER_ID, text=f"⚠️ Bot Error Alert ⚠️\n\n{error_text[:4000]}")
@@ -93,15 +522,7 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 
 # Access guard (keeps original behavior)
 def is_authorized_in_db(user_id: int) -> bool:
-    now = datetime.datetime.now()
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute("""
-                DELETE FROM logs WHERE 1=0
-            """)  # no-op but keeps pattern similar if you later add access table
-    except Exception:
-        pass
+    # no access table yet, so no DB round-trip; add the lookup here once one exists
     # we keep simple ALLOWED_USERS logic from NIKALLLLLLL module
     return user_id in getattr(NIKALLLLLLL, "ALLOWED_USERS", [])  # fallback
 
@@ -119,8 +540,11 @@ def get_access_text():
     )
 
 def protected(handler_func, command_name):
+    timer = HANDLER_SECONDS.labels(command_name)
+
     async def wrapper(update, context):
         user = update.effective_user
+        started = time.perf_counter()
         try:
             if not is_authorized(user.id):
                 # replaced old ❌ message with premium access text (no other code changed)
@@ -135,6 +559,8 @@ def protected(handler_func, command_name):
             except Exception:
                 # bubble up to application handler
                 raise
+        finally:
+            timer.observe(time.perf_counter() - started)
     return wrapper
 
 # Register handlers only if application available
@@ -149,11 +575,13 @@ if application:
     application.add_handler(CommandHandler("setvcfstart",    protected(set_vcf_start, "setvcfstart")))
     application.add_handler(CommandHandler("setcountrycode", protected(set_country_code, "setcountrycode")))
     application.add_handler(CommandHandler("setgroup",       protected(set_group_number, "setgroup")))
+    application.add_handler(CommandHandler("setzip",         protected(set_zip_mode, "setzip")))
     application.add_handler(CommandHandler("makevcf",        protected(make_vcf_command, "makevcf")))
     application.add_handler(CommandHandler("merge",          protected(merge_command, "merge")))
     application.add_handler(CommandHandler("done",           protected(done_merge, "done")))
     application.add_handler(CommandHandler("txt2vcf",        protected(txt2vcf, "txt2vcf")))
     application.add_handler(CommandHandler("vcf2txt",        protected(vcf2txt, "vcf2txt")))
+    application.add_handler(CommandHandler("cancel",         protected(cancel_jobs, "cancel")))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     application.add_error_handler(error_handler)
@@ -163,44 +591,64 @@ flask_app = Flask(__name__)
 flask_app.secret_key = os.environ.get("FLASK_SECRET", "super-secret-key")
 
 # Helper charts data (derived from logs)
+def fetch_totals(c) -> Tuple[int, int, int]:
+    c.execute("SELECT COUNT(*) FROM rollup_users")
+    total_users = c.fetchone()[0] or 0
+    c.execute("""
+        SELECT count FROM rollup_action_totals
+        WHERE action_id = (SELECT id FROM actions WHERE name = 'makevcf')
+    """)
+    row = c.fetchone()
+    total_files = row[0] if row else 0
+    c.execute("SELECT SUM(count) FROM rollup_action_totals")
+    total_actions = c.fetchone()[0] or 0
+    return total_users, total_files, total_actions
+
 def chart_data_last_7_days() -> Tuple[List[str], List[int], List[int]]:
     today = datetime.datetime.now().date()
     days = [(today - datetime.timedelta(days=i)) for i in range(6, -1, -1)]
     labels = [d.strftime('%d %b') for d in days]
 
-    daily_users = {d.strftime('%Y-%m-%d'): set() for d in days}
+    daily_users = {d.strftime('%Y-%m-%d'): 0 for d in days}
     daily_files = {d.strftime('%Y-%m-%d'): 0 for d in days}
 
     try:
         with sqlite3.connect(DB_FILE) as conn:
             c = conn.cursor()
             c.execute("""
-                SELECT user_id, action, date(timestamp)
-                FROM logs
-                WHERE date(timestamp) >= date(?)
-            """, ((today - datetime.timedelta(days=6)).strftime('%Y-%m-%d'),))
-            for uid, action, dt in c.fetchall():
-                if dt in daily_users: daily_users[dt].add(uid)
-                if dt in daily_files and action == 'makevcf': daily_files[dt] += 1
+                SELECT day, COUNT(*) FROM rollup_daily_users
+                WHERE day >= ?
+                GROUP BY day
+            """, (days[0].strftime('%Y-%m-%d'),))
+            for dt, users in c.fetchall():
+                if dt in daily_users: daily_users[dt] = users
+            c.execute("""
+                SELECT date(hour, 'unixepoch', 'localtime') AS d, SUM(count)
+                FROM rollup_hourly
+                WHERE hour >= ? AND action_id = (SELECT id FROM actions WHERE name = 'makevcf')
+                GROUP BY d
+            """, (day_start_ts(days[0]),))
+            for dt, files in c.fetchall():
+                if dt in daily_files: daily_files[dt] = files
     except Exception:
         pass
 
-    users_counts = [len(daily_users[d.strftime('%Y-%m-%d')]) for d in days]
+    users_counts = [daily_users[d.strftime('%Y-%m-%d')] for d in days]
     files_counts = [daily_files[d.strftime('%Y-%m-%d')] for d in days]
     return labels, users_counts, files_counts
 
 def hourly_distribution_today() -> Tuple[List[str], List[int]]:
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
+    today = datetime.datetime.now().date()
     buckets = {f"{h:02d}:00": 0 for h in range(24)}
     try:
         with sqlite3.connect(DB_FILE) as conn:
             c = conn.cursor()
             c.execute("""
-                SELECT strftime('%H:00', timestamp) AS hh, COUNT(*)
-                FROM logs
-                WHERE date(timestamp) = date(?)
+                SELECT strftime('%H:00', hour, 'unixepoch', 'localtime') AS hh, SUM(count)
+                FROM rollup_hourly
+                WHERE hour >= ? AND hour < ?
                 GROUP BY 1
-            """, (today,))
+            """, (day_start_ts(today), day_start_ts(today + datetime.timedelta(days=1))))
             for hh, cnt in c.fetchall():
                 if hh in buckets: buckets[hh] = cnt
     except Exception:
@@ -209,65 +657,15 @@ def hourly_distribution_today() -> Tuple[List[str], List[int]]:
     values = [buckets[k] for k in labels]
     return labels, values
 
-# Public Dashboard route
-@flask_app.route('/')
-def dashboard():
-    uptime = format_uptime()
-    total_users = total_files = total_actions = 0
-    logs = []
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(DISTINCT user_id) FROM logs")
-            total_users = c.fetchone()[0] or 0
-            c.execute("SELECT COUNT(*) FROM logs WHERE action='makevcf'")
-            total_files = c.fetchone()[0] or 0
-            c.execute("SELECT COUNT(*) FROM logs")
-            total_actions = c.fetchone()[0] or 0
-            c.execute("SELECT username, user_id, action, timestamp FROM logs ORDER BY timestamp DESC LIMIT 50")
-            logs = c.fetchall()
-    except Exception:
-        logs = []
-
-    errors_tail = []
-    if os.path.exists(ERROR_LOG):
-        try:
-            with open(ERROR_LOG, "r", encoding="utf-8", errors="ignore") as f:
-                errors_tail = f.readlines()[-10:]
-        except Exception:
-            errors_tail = ["(unable to read error log)"]
-
-    # Anime-style dashboard HTML (GOD MADARA BOT)
-    return render_template_string("""
+# ============ DASHBOARD ASSETS (anime-style GOD MADARA BOT) ============
+DASHBOARD_HTML = """
 <!doctype html>
 <html lang="en"><head>
 <meta charset="utf-8" />
 <meta name="viewport" content="width=device-width,initial-scale=1" />
 <title>GOD MADARA BOT — Dashboard</title>
 <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-<style>
-:root{--bg:#05060a;--accent1:#ff4fd8;--accent2:#6b21ff;--muted:#9aa4b2}
-*{box-sizing:border-box}body{margin:0;font-family:Inter,Arial;background:
- radial-gradient(circle at 10% 10%, rgba(124,58,237,0.06), transparent 6%),
- radial-gradient(circle at 90% 90%, rgba(6,182,212,0.04), transparent 8%), #0a0c14;color:#e6eef6}
-.header{display:flex;align-items:center;gap:12px;padding:18px 22px}
-.logo{width:64px;height:64px;border-radius:12px;background:linear-gradient(135deg,var(--accent1),var(--accent2));display:flex;align-items:center;justify-content:center;font-weight:900;font-size:20px;box-shadow:0 10px 40px rgba(107,33,255,0.12)}
-.title{font-size:20px;font-weight:800;color:var(--accent1);text-shadow:0 4px 20px rgba(124,58,237,0.08)}
-.subtitle{color:var(--muted);font-size:12px}
-.controls{margin-left:auto;display:flex;gap:8px}
-.btn{padding:8px 12px;border-radius:10px;border:none;background:linear-gradient(90deg,var(--accent1),var(--accent2));color:white;cursor:pointer;font-weight:700}
-.container{max-width:1100px;margin:18px auto;padding:0 16px}
-.grid{display:grid;grid-template-columns:repeat(12,1fr);gap:12px}
-.card{background:linear-gradient(180deg,rgba(255,255,255,0.02),transparent);padding:12px;border-radius:12px;border:1px solid rgba(255,255,255,0.03)}
-.stat{grid-column:span 3;display:flex;flex-direction:column;gap:6px}
-.stat .num{font-size:20px;font-weight:800}
-@media (max-width:900px){.stat{grid-column:span 6}.chart{grid-column:span 12}.side{grid-column:span 12}}
-.chart{grid-column:span 8}
-.side{grid-column:span 4}
-.logs pre{max-height:320px;overflow:auto;background:#041025;padding:12px;border-radius:8px;color:#bfe7ff}
-.uptime{font-family:monospace;font-weight:700}
-.muted{color:var(--muted);font-size:12px}
-</style>
+<link rel="stylesheet" href="/assets/dashboard.css" />
 </head><body>
   <div class="header">
     <div class="logo">G</div>
@@ -296,8 +694,36 @@ def dashboard():
     </div>
   </div>
 
-<script>
-let uptime_sec = {{uptime_seconds}};
+<script>let uptime_sec = {{uptime_seconds}};</script>
+<script src="/assets/dashboard.js"></script>
+</body></html>
+"""
+
+DASHBOARD_CSS = """
+:root{--bg:#05060a;--accent1:#ff4fd8;--accent2:#6b21ff;--muted:#9aa4b2}
+*{box-sizing:border-box}body{margin:0;font-family:Inter,Arial;background:
+ radial-gradient(circle at 10% 10%, rgba(124,58,237,0.06), transparent 6%),
+ radial-gradient(circle at 90% 90%, rgba(6,182,212,0.04), transparent 8%), #0a0c14;color:#e6eef6}
+.header{display:flex;align-items:center;gap:12px;padding:18px 22px}
+.logo{width:64px;height:64px;border-radius:12px;background:linear-gradient(135deg,var(--accent1),var(--accent2));display:flex;align-items:center;justify-content:center;font-weight:900;font-size:20px;box-shadow:0 10px 40px rgba(107,33,255,0.12)}
+.title{font-size:20px;font-weight:800;color:var(--accent1);text-shadow:0 4px 20px rgba(124,58,237,0.08)}
+.subtitle{color:var(--muted);font-size:12px}
+.controls{margin-left:auto;display:flex;gap:8px}
+.btn{padding:8px 12px;border-radius:10px;border:none;background:linear-gradient(90deg,var(--accent1),var(--accent2));color:white;cursor:pointer;font-weight:700}
+.container{max-width:1100px;margin:18px auto;padding:0 16px}
+.grid{display:grid;grid-template-columns:repeat(12,1fr);gap:12px}
+.card{background:linear-gradient(180deg,rgba(255,255,255,0.02),transparent);padding:12px;border-radius:12px;border:1px solid rgba(255,255,255,0.03)}
+.stat{grid-column:span 3;display:flex;flex-direction:column;gap:6px}
+.stat .num{font-size:20px;font-weight:800}
+@media (max-width:900px){.stat{grid-column:span 6}.chart{grid-column:span 12}.side{grid-column:span 12}}
+.chart{grid-column:span 8}
+.side{grid-column:span 4}
+.logs pre{max-height:320px;overflow:auto;background:#041025;padding:12px;border-radius:8px;color:#bfe7ff}
+.uptime{font-family:monospace;font-weight:700}
+.muted{color:var(--muted);font-size:12px}
+"""
+
+DASHBOARD_JS = """
 function pad(n){return String(n).padStart(2,'0')}
 function secToHMS(s){const d=Math.floor(s/86400);s%=86400;const h=Math.floor(s/3600);const m=Math.floor((s%3600)/60);const ss=s%60;return (d?d+'d ':'')+pad(h)+':'+pad(m)+':'+pad(ss)}
 setInterval(()=>{uptime_sec++;document.getElementById('stat-uptime').innerText = secToHMS(uptime_sec)},1000);
@@ -305,12 +731,7 @@ setInterval(()=>{uptime_sec++;document.getElementById('stat-uptime').innerText =
 async function fetchStats(){
   try{
     const res = await fetch('/api/stats'); const data = await res.json();
-    document.getElementById('stat-users').innerText = data.users;
-    document.getElementById('stat-files').innerText = data.files;
-    document.getElementById('stat-actions').innerText = data.actions;
-    uptime_sec = data.uptime_seconds || uptime_sec;
-    document.getElementById('stat-uptime').innerText = data.uptime_str || secToHMS(uptime_sec);
-    document.getElementById('sysinfo').innerText = (data.system.cpu||'-') + "% CPU / " + (data.system.ram||'-') + "% RAM / " + (data.system.disk||'-');
+    applyStats(data);
   }catch(e){console.error(e)}
 }
 
@@ -323,8 +744,36 @@ async function fetchLogsAndErrors(){
   try{ const r2=await fetch('/api/errors-tail'); const errs = await r2.json(); document.getElementById('recent-errors').innerText = errs.join('') }catch(e){}
 }
 
-setInterval(()=>{ fetchStats(); fetchCharts(); fetchHourly(); fetchLogsAndErrors(); }, 5000);
-fetchStats(); fetchCharts(); fetchHourly(); fetchLogsAndErrors();
+function applyStats(data){
+  document.getElementById('stat-users').innerText = data.users;
+  document.getElementById('stat-files').innerText = data.files;
+  document.getElementById('stat-actions').innerText = data.actions;
+  uptime_sec = data.uptime_seconds || uptime_sec;
+  document.getElementById('stat-uptime').innerText = data.uptime_str || secToHMS(uptime_sec);
+  document.getElementById('sysinfo').innerText = (data.system.cpu||'-') + "% CPU / " + (data.system.ram||'-') + "% RAM / " + (data.system.disk||'-');
+}
+let logRows = [];
+function renderLogs(){ document.getElementById('recent-logs').innerText = logRows.map(r=>`${r[4]} | ${r[1]}(${r[2]}) -> ${r[3]}`).join('\\n'); }
+
+function startPolling(){
+  setInterval(()=>{ fetchStats(); fetchCharts(); fetchHourly(); fetchLogsAndErrors(); }, 5000);
+  fetchStats(); fetchCharts(); fetchHourly(); fetchLogsAndErrors();
+}
+
+if (window.EventSource){
+  // single push stream: full snapshot on connect, then only what changed
+  const es = new EventSource('/api/stream');
+  es.onmessage = (ev)=>{
+    const d = JSON.parse(ev.data);
+    if (d.stats) applyStats(d.stats);
+    if (d.chart) updateMainChart(d.chart.labels, d.chart.daily_users, d.chart.daily_files);
+    if (d.hourly) updateHourChart(d.hourly.labels, d.hourly.values);
+    if (d.errors) document.getElementById('recent-errors').innerText = d.errors.join('');
+    if (d.logs){ logRows = d.full ? d.logs : d.logs.concat(logRows).slice(0, 200); renderLogs(); }
+  };
+} else {
+  startPolling();
+}
 
 /* Charts */
 const ctx = document.getElementById('chartMain').getContext('2d');
@@ -337,80 +786,314 @@ function updateHourChart(labels, vals){ hourChart.data.labels = labels; hourChar
 /* buttons */
 document.getElementById('download-logs').addEventListener('click', ()=>{ window.location.href='/api/errors-tail'; });
 document.getElementById('restart-btn').addEventListener('click', async ()=>{ if(!confirm('Restart the bot?')) return; try{ const r = await fetch('/api/restart', {method:'POST'}); const j = await r.json(); alert(j.message||'Restarting'); }catch(e){alert('Restart failed');} });
-</script></body></html>
-    """,
-    uptime_seconds=uptime_seconds(),
-    logs_text="\n".join([f"{r[3]} | {r[0]}({r[1]}) -> {r[2]}" for r in logs]) if logs else "(no logs)",
-    errors_text="".join(errors_tail) if errors_tail else "(no errors)"
+"""
+
+ASSET_MAX_AGE = int(os.environ.get("ASSET_MAX_AGE", "86400"))
+GZIP_MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "500"))
+ASSETS = {}  # name -> (body, gzipped body, mimetype, etag); gzip done once here, not per request
+for _name, _body, _mimetype in (("dashboard.css", DASHBOARD_CSS, "text/css"),
+                                ("dashboard.js", DASHBOARD_JS, "application/javascript")):
+    _raw = _body.encode("utf-8")
+    ASSETS[_name] = (_raw, gzip.compress(_raw, compresslevel=9), _mimetype, hashlib.sha1(_raw).hexdigest())
+_dashboard_template = None
+
+def dashboard_template():
+    # compiled once per process, not on every request like render_template_string
+    global _dashboard_template
+    if _dashboard_template is None:
+        _dashboard_template = flask_app.jinja_env.from_string(DASHBOARD_HTML)
+    return _dashboard_template
+
+@flask_app.route('/assets/<name>')
+def dashboard_asset(name):
+    if name not in ASSETS:
+        return jsonify({"error": "not found"}), 404
+    body, gz_body, mimetype, etag = ASSETS[name]
+    if "gzip" in request.headers.get("Accept-Encoding", "").lower():
+        resp = Response(gz_body, mimetype=mimetype)
+        resp.headers["Content-Encoding"] = "gzip"
+        etag += "-gz"
+    else:
+        resp = Response(body, mimetype=mimetype)
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = ASSET_MAX_AGE
+    return resp.make_conditional(request)
+
+@flask_app.after_request
+def gzip_response(resp):
+    if (resp.status_code != 200 or resp.direct_passthrough or resp.is_streamed
+            or "Content-Encoding" in resp.headers
+            or resp.mimetype not in ("application/json", "text/html")
+            or "gzip" not in request.headers.get("Accept-Encoding", "").lower()):
+        return resp
+    data = resp.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return resp
+    resp.set_data(gzip.compress(data, compresslevel=5))
+    resp.headers["Content-Encoding"] = "gzip"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+# Public Dashboard route
+@flask_app.route('/')
+def dashboard():
+    uptime = format_uptime()
+    total_users = total_files = total_actions = 0
+    logs = []
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            c = conn.cursor()
+            total_users, total_files, total_actions = fetch_totals(c)
+            c.execute("""
+                SELECT l.username, l.user_id, a.name, l.ts
+                FROM logs l JOIN actions a ON a.id = l.action_id
+                ORDER BY l.ts DESC LIMIT 50
+            """)
+            logs = [(uname, uid, action, fmt_ts(ts)) for uname, uid, action, ts in c.fetchall()]
+    except Exception:
+        logs = []
+
+    errors_tail = errors_tail_lines(10)
+
+    return dashboard_template().render(
+        uptime_seconds=uptime_seconds(),
+        logs_text="\n".join([f"{r[3]} | {r[0]}({r[1]}) -> {r[2]}" for r in logs]) if logs else "(no logs)",
+        errors_text="".join(errors_tail) if errors_tail else "(no errors)"
     )
 
 # API endpoints for dashboard charts/logs/errors
-@flask_app.route('/api/stats')
-def api_stats():
+def stats_payload() -> dict:
     with sqlite3.connect(DB_FILE) as conn:
         c = conn.cursor()
-        c.execute("SELECT COUNT(DISTINCT user_id) FROM logs")
-        total_users = c.fetchone()[0] or 0
-        c.execute("SELECT COUNT(*) FROM logs WHERE action='makevcf'")
-        total_files = c.fetchone()[0] or 0
-        c.execute("SELECT COUNT(*) FROM logs")
-        total_actions = c.fetchone()[0] or 0
+        total_users, total_files, total_actions = fetch_totals(c)
+        migrating = migration_progress(c)
 
     sys_info = {"cpu": None, "ram": None, "disk": None}
-    try:
-        import psutil
-        sys_info["cpu"] = round(psutil.cpu_percent(interval=0.1), 1)
-        sys_info["ram"] = round(psutil.virtual_memory().percent, 1)
-        disk = psutil.disk_usage("/")
-        sys_info["disk"] = f"{disk.free / (1024**3):.1f} GB free"
-    except Exception:
-        pass
+    sample = system_sampler.latest()
+    if sample:
+        sys_info["cpu"] = sample["cpu"]
+        sys_info["ram"] = sample["ram"]
+        if sample["disk_free_gb"] is not None:
+            sys_info["disk"] = f"{sample['disk_free_gb']:.1f} GB free"
+        sys_info["rss_mb"] = sample["rss_mb"]
+        sys_info["fds"] = sample["fds"]
+        sys_info["loop_lag_ms"] = sample["loop_lag_ms"]
 
-    return jsonify({
+    return {
         "users": total_users,
         "files": total_files,
         "actions": total_actions,
         "uptime_seconds": uptime_seconds(),
         "uptime_str": format_uptime(),
-        "system": sys_info
-    })
+        "system": sys_info,
+        "migration_percent": migrating,  # old logs still being copied in: totals are growing
+    }
+
+def chart_payload() -> dict:
+    labels, daily_users, daily_files = chart_data_last_7_days()
+    return {"labels": labels, "daily_users": daily_users, "daily_files": daily_files}
+
+def hourly_payload() -> dict:
+    labels, values = hourly_distribution_today()
+    return {"labels": labels, "values": values}
+
+def recent_logs(limit: int, after_id: int = 0) -> list:
+    with sqlite3.connect(DB_FILE) as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT l.id, l.username, l.user_id, a.name, l.ts
+            FROM logs l JOIN actions a ON a.id = l.action_id
+            WHERE l.id > ?
+            ORDER BY l.id DESC LIMIT ?
+        """, (after_id, limit))
+        return [(lid, uname, uid, action, fmt_ts(ts)) for lid, uname, uid, action, ts in c.fetchall()]
+
+@flask_app.route('/api/stats')
+def api_stats():
+    return jsonify(stats_payload())
 
 @flask_app.route('/api/chart-data')
 def api_chart():
-    labels, daily_users, daily_files = chart_data_last_7_days()
-    return jsonify({"labels": labels, "daily_users": daily_users, "daily_files": daily_files})
+    return jsonify(chart_payload())
 
 @flask_app.route('/api/hourly-data')
 def api_hourly():
-    labels, values = hourly_distribution_today()
-    return jsonify({"labels": labels, "values": values})
+    return jsonify(hourly_payload())
 
 @flask_app.route('/api/logs')
 def api_logs():
     limit = int(request.args.get("limit", "200"))
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, username, user_id, action, timestamp FROM logs ORDER BY id DESC LIMIT ?", (limit,))
-        rows = c.fetchall()
-    return jsonify(rows)
+    return jsonify(recent_logs(limit))
+
+@flask_app.route('/api/system-history')
+def api_system_history():
+    limit = max(1, int(request.args.get("limit", str(SAMPLE_HISTORY))))
+    return jsonify(system_sampler.history(limit))
 
 @flask_app.route('/api/errors-tail')
 def api_errors_tail():
-    lines = []
+    return jsonify(errors_tail_lines(200))
+
+# ============ LIVE FEED (SSE) ============
+class DashboardFeed:
+    # One producer thread builds the dashboard state once per tick, no matter how
+    # many tabs are open, and fans out only what changed since the previous tick.
+    LOG_WINDOW = 200
+
+    def __init__(self, tick: float = STREAM_TICK):
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+        self.state = {}
+        self.logs = []          # newest first, at most LOG_WINDOW rows
+        self.last_log_id = 0
+
+    def _collect(self) -> dict:
+        changed = {}
+        for key, build in (("stats", stats_payload), ("chart", chart_payload),
+                           ("hourly", hourly_payload), ("errors", errors_tail_lines)):
+            try:
+                value = build()
+            except Exception:
+                continue
+            if self.state.get(key) != value:
+                self.state[key] = changed[key] = value
+        try:
+            new_logs = recent_logs(self.LOG_WINDOW, self.last_log_id)
+        except Exception:
+            new_logs = []
+        if new_logs:
+            self.last_log_id = new_logs[0][0]
+            self.logs = (new_logs + self.logs)[:self.LOG_WINDOW]
+            changed["logs"] = new_logs
+        return changed
+
+    def subscribe(self) -> "queue.Queue":
+        q = queue.Queue(maxsize=64)
+        with self.lock:
+            if not self.state:
+                self._collect()
+            q.put_nowait(dict(self.state, logs=self.logs, full=True))
+            self.subscribers.add(q)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="dashboard-feed", daemon=True)
+                self.thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+                delta = self._collect()
+                if not delta:
+                    continue
+                for q in list(self.subscribers):
+                    try:
+                        q.put_nowait(delta)
+                    except queue.Full:
+                        # stalled client: drop it; EventSource reconnects and gets a full snapshot
+                        self.subscribers.discard(q)
+
+dashboard_feed = DashboardFeed()
+
+@flask_app.route('/metrics')
+def prometheus_metrics():
+    if DASHBOARD_MODE != "external":
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+    # this is a gunicorn worker: bot-side series only move in the bot process, so relay its listener
+    if not METRICS_PORT:
+        return Response("# bot metrics are served by the bot process; set METRICS_PORT\n", status=503,
+                        content_type=metrics.CONTENT_TYPE)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{METRICS_PORT}/metrics", timeout=5) as r:
+            return Response(r.read(), content_type=metrics.CONTENT_TYPE)
+    except Exception as e:
+        return Response(f"# bot metrics unavailable: {e}\n", status=503, content_type=metrics.CONTENT_TYPE)
+
+@flask_app.route('/api/stream')
+def api_stream():
+    q = dashboard_feed.subscribe()
+    def events():
+        # bounded: a WSGI bridge may not notice a gone client, so a stream never holds a thread forever
+        deadline = time.monotonic() + STREAM_MAX_AGE
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    event = q.get(timeout=min(15, max(0.1, deadline - time.monotonic())))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            dashboard_feed.unsubscribe(q)
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ============ TELEGRAM WEBHOOK ============
+@flask_app.route(WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    # runs on a Flask thread: verify, hand the raw update to the bot's loop, answer at once
+    if webhook_loop is None or application is None:
+        return jsonify({"error": "webhook not active"}), 503
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+        return jsonify({"error": "forbidden"}), 403
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "bad update"}), 400
+    webhook_loop.call_soon_threadsafe(enqueue_update, data)
+    return "", 200
+
+def enqueue_update(data: dict):
     try:
-        if os.path.exists(ERROR_LOG):
-            with open(ERROR_LOG, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()[-200:]
+        application.update_queue.put_nowait(Update.de_json(data, application.bot))
     except Exception as e:
-        lines = [f"(error reading log: {e})"]
-    return jsonify(lines)
+        write_error_log(f"{datetime.datetime.utcnow()} - Webhook update dropped: {e}\n")
+
+async def run_webhook():
+    global webhook_loop
+    webhook_loop = asyncio.get_running_loop()
+    await application.initialize()
+    await on_startup(application)
+    await application.start()
+    await application.bot.set_webhook(
+        url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        webhook_loop = None
+        await application.stop()
+        await application.shutdown()
 
 @flask_app.route('/api/restart', methods=['POST'])
 def api_restart():
+    if DASHBOARD_MODE == "external":
+        # this process is only the dashboard; re-exec'ing a gunicorn worker would not touch the bot
+        return jsonify({"status": "error", "message": "dashboard runs separately; restart the bot via your process manager"}), 409
     # logs and restart
     log_action(0, "dashboard", "restart_requested")
     def do_restart():
         time.sleep(0.9)
+        try:
+            # execv skips atexit, so persist queued settings and log writes first
+            NIKALLLLLLL.settings_store.flush()
+            action_log.close()
+        except Exception:
+            pass
         try:
             python = sys.executable
             os.execv(python, [python] + sys.argv)
@@ -422,32 +1105,85 @@ def api_restart():
 # ============ RUN ============
 
 def run_flask():
+    # embedded mode: uvicorn serves the Flask app from this thread; WSGI calls run on a pool sized like
+    # the external server's threads (signal handlers stay with the main thread, uvicorn skips them here)
+    import uvicorn
+    from uvicorn.middleware.wsgi import WSGIMiddleware
     try:
-        flask_app.run(host='0.0.0.0', port=APP_PORT)
+        config = uvicorn.Config(WSGIMiddleware(flask_app, workers=DASHBOARD_THREADS), host='0.0.0.0',
+                                port=APP_PORT, log_level="warning", access_log=False)
+        uvicorn.Server(config).run()
     except Exception as e:
-        try:
-            with open(ERROR_LOG, "a", encoding="utf-8") as f:
-                f.write(f"{datetime.datetime.utcnow()} - Flask Error: {e}\n")
-        except Exception:
-            pass
+        write_error_log(f"{datetime.datetime.utcnow()} - Flask Error: {e}\n")
         if tg_bot and OWNER_ID:
             try:
                 tg_bot.send_message(chat_id=OWNER_ID, text=f"⚠️ Flask Crash Alert ⚠️\n\n{str(e)}")
             except Exception:
                 pass
 
+def serve_dashboard():
+    # production server for the dashboard in its own process: `python main.py dashboard`
+    # (equivalent to `gunicorn -k gthread -w 2 --threads 16 -b 0.0.0.0:$PORT main:flask_app`)
+    from gunicorn.app.base import BaseApplication
+
+    class DashboardServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{APP_PORT}")
+            self.cfg.set("workers", DASHBOARD_WORKERS)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", DASHBOARD_THREADS)
+            self.cfg.set("timeout", 60)
+
+        def load(self):
+            return flask_app
+
+    DashboardServer().run()
+
 if __name__ == "__main__":
-    init_db()
-    # start Flask in background thread
-    threading.Thread(target=run_flask, daemon=True).start()
+    if sys.argv[1:2] == ["dashboard"]:
+        os.environ["DASHBOARD_MODE"] = DASHBOARD_MODE = "external"
+        serve_dashboard()
+        sys.exit(0)
 
-    # start telegram bot polling (blocking) if token provided
+    migration_pending = init_db()
+    NIKALLLLLLL.clear_scratch()
+    system_sampler.start()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    if DASHBOARD_MODE == "embedded":
+        # start Flask in background thread
+        threading.Thread(target=run_flask, daemon=True).start()
+    if migration_pending:
+        start_legacy_migration()  # old logs are copied in while the bot already serves
+
+    # start telegram bot (blocking) if token provided: webhook when configured, else polling
     if application:
         try:
-            print("Starting Telegram bot polling...")
-            application.run_polling()
+            if WEBHOOK_URL and DASHBOARD_MODE == "embedded":
+                print(f"Starting Telegram bot webhook at {WEBHOOK_URL}{WEBHOOK_PATH} ...")
+                asyncio.run(run_webhook())
+            elif WEBHOOK_URL:
+                # the dashboard port is gunicorn's: take updates on PTB's own (tornado) server instead
+                print(f"Starting Telegram bot webhook at {WEBHOOK_URL}{WEBHOOK_PATH} (port {WEBHOOK_PORT}) ...")
+                application.run_webhook(
+                    listen="0.0.0.0",
+                    port=WEBHOOK_PORT,
+                    url_path=WEBHOOK_PATH.lstrip("/"),
+                    webhook_url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=WEBHOOK_MAX_CONNECTIONS,
+                )
+            else:
+                print("Starting Telegram bot polling...")
+                application.run_polling()
+        except KeyboardInterrupt:
+            pass
         except Exception as e:
             print("Bot crashed:", e)
+        finally:
+            NIKALLLLLLL.converter.shutdown()
+            action_log.close()
     else:
         print("BOT_TOKEN not set — dashboard running only.")
         try:
@@ -0,0 +1,174 @@
+"""Minimal Prometheus metrics for the bot and dashboard.
+
+Families have a fixed label set; each label combination gets one child object that
+is created once and then updated in place, so hot paths resolve their child up
+front and an update is a lock plus a few arithmetic ops. render() produces the
+Prometheus text exposition format for the /metrics endpoint; serve() exposes it from
+any process on a port of its own.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from typing import Callable, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REGISTRY = []
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class _Family:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.children[values] = self._child()
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _labelstr(self, values: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self, out: list):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in list(self.children.items()):
+            self._render_child(out, values, child)
+
+    def _render_child(self, out: list, values, child):
+        value = child.get()
+        if value is not None:
+            out.append(f"{self.name}{self._labelstr(values)} {_fmt(value)}")
+
+class _Value:
+    __slots__ = ("value", "lock", "fn")
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self.lock = lock
+        self.fn: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, fn: Callable[[], float]):
+        # value read at scrape time, e.g. the length of a queue
+        self.fn = fn
+
+    def get(self) -> Optional[float]:
+        if self.fn is None:
+            return self.value
+        try:
+            return float(self.fn())
+        except Exception:
+            return None
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _child(self):
+        return _Value(self.lock)
+
+class Gauge(_Family):
+    kind = "gauge"
+
+    def _child(self):
+        return _Value(self.lock)
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "lock")
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above the largest bound
+        self.sum = 0.0
+        self.lock = lock
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.bounds, self.lock)
+
+    def _render_child(self, out: list, values, child):
+        with self.lock:
+            counts = list(child.counts)
+            total = child.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _fmt(bound) + '"'
+            out.append(f"{self.name}_bucket{self._labelstr(values, le)} {cumulative}")
+        out.append(f"{self.name}_sum{self._labelstr(values)} {_fmt(total)}")
+        out.append(f"{self.name}_count{self._labelstr(values)} {cumulative}")
+
+def render() -> str:
+    out = []
+    for family in REGISTRY:
+        family.render(out)
+    return "\n".join(out) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve this process's registry at http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server